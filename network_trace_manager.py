@@ -1,17 +1,1016 @@
 #!/usr/bin/env python3
 
+import bisect
 import configparser
+import copy
+import dataclasses
 import random
 import datetime
+import functools
+import io
 import logging
 import json
+import os
+import struct
+import tarfile
+import tempfile
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
 
 datetime_format = "%Y-%m-%d %H:%M:%S.%f"
 
+# trace timestamps are stored as microseconds since this (naive) epoch
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+def _to_datetime(microseconds):
+        return _EPOCH + datetime.timedelta(microseconds=int(microseconds))
+
+def _to_microseconds(timestamp):
+        return (timestamp - _EPOCH) // _MICROSECOND
+
+def _seconds_to_microseconds(sec):
+        return round(sec * 1000000)
+
+def _seconds_to_microseconds_array(times):
+        return np.rint(np.asarray(times, dtype=np.float64) * 1000000).astype(np.int64)
+
+# the mode of the files created by open(), read once as the umask can only be read by
+# setting it (which would affect concurrent threads)
+_umask = os.umask(0)
+os.umask(_umask)
+_FILE_MODE = 0o666 & ~_umask
+
+def _replace_file(temporary_filename, filename):
+        """Move a temporary file (created with mode 0600) to filename, with the permissions
+        of a file created by open(), so that it can be shared with other users"""
+
+        os.chmod(temporary_filename, _FILE_MODE)
+        os.replace(temporary_filename, filename)
+
 class InvalidConfiguration(Exception):
         """Invalid configuration"""
         pass
 
+@dataclasses.dataclass(frozen=True, slots=True)
+class TraceConfig:
+        """The configuration of a NetworkTraceManager, resolved once
+
+        A TraceConfig is immutable and hashable. Build it from keyword arguments (the
+        field names below) or, with from_config(), from a configparser section or a
+        dictionary of configuration keys as found in the ini files. Validation is left to
+        NetworkTraceManager, which raises InvalidConfiguration for incomplete
+        configurations."""
+
+        mapping_file: str = None
+        traceseed: int = None
+        startingitemseed: int = None
+        max_tracegap_seconds: int = None
+        typeofmeasure: str = None
+        protocol: str = None
+        observerPos: str = None
+        cross_traffic: str = None
+        access_technology: str = None
+        sender_identity: str = None
+        receiver_identity: str = None
+        trace_cache: bool = True
+        trace_cache_dir: str = None
+        trace_archive: str = None
+        lazy: bool = False
+
+        # the configuration keys of the fields, where they differ from the field names
+        _KEYS = {
+                "cross_traffic": "cross-traffic",
+                "access_technology": "access-technology",
+                "sender_identity": "sender-identity",
+                "receiver_identity": "receiver-identity"}
+        _INTEGERS = ("traceseed", "startingitemseed", "max_tracegap_seconds")
+        _BOOLEANS = ("trace_cache", "lazy")
+
+        @classmethod
+        def from_config(cls, config):
+                """Return the TraceConfig of a configparser section, or of a dictionary of
+                configuration keys (either the keys of the ini files or the field names, in any
+                case), with values converted as configparser's getint() and getboolean() do"""
+
+                # keys are case-insensitive, as in configparser
+                if not isinstance(config, configparser.SectionProxy):
+                        config = {key.lower(): value for key, value in config.items()}
+
+                values = {}
+                for field in dataclasses.fields(cls):
+                        value = config.get(cls._KEYS.get(field.name, field.name).lower())
+                        if value == None:
+                                value = config.get(field.name.lower())
+                        if value == None:
+                                continue
+
+                        if field.name in cls._INTEGERS:
+                                value = int(value)
+                        elif field.name in cls._BOOLEANS and isinstance(value, str):
+                                if value.lower() not in configparser.ConfigParser.BOOLEAN_STATES:
+                                        raise ValueError(f'Not a boolean: {value}')
+                                value = configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+                        values[field.name] = value
+
+                return cls(**values)
+
+class MappingCatalog:
+        """Process-wide, indexed view of a mapping file
+
+        Each mapping file is parsed once per process and parsed again only when its
+        modification time changes. Entries are indexed by the fields that are always
+        compared for equality, so that selecting the trace list for a setup is a
+        dictionary lookup followed by the endpoint checks on a handful of candidates."""
+
+        _INDEX_KEYS = ("typeofmeasure", "command", "ObserverPos", "noise", "access-technology")
+
+        # the fields compared with each parameter of NetworkTraceManager.get_tracelist()
+        _TRACELIST_FIELDS = (
+                ("typeofmeasure",),
+                ("senderIdentity", "first-endpoint"),
+                ("receiverIdentity", "second-endpoint"),
+                ("direction",),
+                ("command",),
+                ("noise",),
+                ("ObserverPos",),
+                ("access-technology",))
+
+        _catalogs = {}
+        _lock = threading.Lock()
+
+        @classmethod
+        def load(cls, mapping_file):
+                """Return the catalog of mapping_file, (re)parsing the file if needed"""
+
+                mapping_file = os.path.abspath(mapping_file)
+                mtime = os.stat(mapping_file).st_mtime_ns
+
+                with cls._lock:
+                        catalog = cls._catalogs.get(mapping_file)
+                        if catalog is None or catalog.mtime != mtime:
+                                catalog = cls(mapping_file, mtime)
+                                cls._catalogs[mapping_file] = catalog
+
+                return catalog
+
+        def __init__(self, mapping_file, mtime):
+                self.mapping_file = mapping_file
+                self.mtime = mtime
+
+                with open (mapping_file, "r") as inputjson:
+                        self.entries = json.load(inputjson)
+
+                # entries missing one of the index keys match any value for that key,
+                # hence they are checked against every query
+                self._index = {}
+                self._unindexed = []
+                for position, elem in enumerate(self.entries):
+                        if all(key in elem for key in self._INDEX_KEYS):
+                                index_key = tuple(elem[key] for key in self._INDEX_KEYS)
+                                self._index.setdefault(index_key, []).append(position)
+                        else:
+                                self._unindexed.append(position)
+
+                self._selections = {}
+
+                # the trace list records of the entries, built once
+                self._records = []
+                for elem in self.entries:
+                        record = MappingCatalog._record(elem)
+                        if record != None:
+                                self._records.append((elem, record))
+                self._tracelists = {}
+
+                # facet index: field -> distinct value -> records having that value
+                facets = {}
+                for _, record in self._records:
+                        for field, value in record.items():
+                                facets.setdefault(field, {}).setdefault(value, []).append(record)
+                self._facets = {
+                        field: MappingProxyType({value: tuple(records) for value, records in values.items()})
+                        for field, values in facets.items()}
+
+                logging.info(f'mapping catalog: {len(self.entries)} entries loaded from {mapping_file}')
+
+        def tracelist(self, *allowed_values):
+                """Return the records of the entries matching the given filter: one value, set of
+                allowed values or None (any value) for each of the fields in _TRACELIST_FIELDS"""
+
+                return self._match(allowed_values)[1]
+
+        def trace_files(self, *allowed_values):
+                """Return the records of the entries matching the given filter (see tracelist()),
+                each along with the list of trace files of the entry"""
+
+                return self._match(allowed_values)[0]
+
+        def _match(self, allowed_values):
+                allowed_values = tuple(MappingCatalog._allowed(values) for values in allowed_values)
+                try:
+                        return self._tracelists[allowed_values]
+                except KeyError:
+                        pass
+
+                checks = [(fields, values)
+                          for fields, values in zip(self._TRACELIST_FIELDS, allowed_values)
+                          if values != None]
+
+                matching = tuple(
+                        (record, MappingCatalog._paths(elem)) for elem, record in self._records
+                        if all(MappingCatalog._allows(elem, fields, values) for fields, values in checks))
+                match = (matching, tuple(record for record, _ in matching))
+
+                self._tracelists[allowed_values] = match
+                return match
+
+        @staticmethod
+        def _paths(elem):
+                path = elem.get("path")
+                if path == None:
+                        return []
+                if isinstance(path, str):
+                        return [path]
+                return path
+
+        def facet(self, field):
+                """Return the distinct values of field in the trace list records, each mapped to
+                the records having that value"""
+
+                return self._facets.get(field, MappingProxyType({}))
+
+        def facet_counts(self, field = None):
+                """Return the number of trace list records having each distinct value of field,
+                or of every field if field is None"""
+
+                if field == None:
+                        return {field: self.facet_counts(field) for field in self._facets}
+
+                return {value: len(records) for value, records in self.facet(field).items()}
+
+        @staticmethod
+        def _allowed(values):
+                if values == None:
+                        return None
+                if isinstance(values, (set, frozenset, list, tuple)):
+                        return frozenset(values)
+                return frozenset((values,))
+
+        @staticmethod
+        def _allows(elem, fields, values):
+                # fields missing from the entry, as well as missing directions, match any value
+                for field in fields:
+                        value = elem.get(field)
+                        if field in elem and value not in values and not (field == "direction" and value == None):
+                                return False
+
+                return True
+
+        @staticmethod
+        def _record(elem):
+                """Return the read-only trace list record of an entry, or None if the entry is
+                not listed (RTT entries having a direction)"""
+
+                command = elem.get("command")
+                if command != None and "RTT" in command and elem.get("direction") != None:
+                        return None
+
+                record = {
+                        'typeofmeasure': elem.get("typeofmeasure"),
+                        'command': command,
+                        'ObserverPos': elem.get("ObserverPos"),
+                        'noise': elem.get("noise"),
+                        'access-technology': elem.get("access-technology")}
+
+                if command == None:
+                        pass
+                elif "TCPBandwidth" in command or "UDPBandwidth" in command:
+                        record['direction'] = elem.get("direction")
+                        record['senderIdentity'] = elem.get("senderIdentity")
+                        record['receiverIdentity'] = elem.get("receiverIdentity")
+
+                elif "TCPRTT" in command or "UDPRTT" in command:
+                        record['first-endpoint'] = elem.get("first-endpoint")
+                        record['second-endpoint'] = elem.get("second-endpoint")
+
+                return MappingProxyType(record)
+
+        def select(self, typeofmeasure, command, observerPos, cross_traffic, access_technology,
+                   sender_identity, receiver_identity):
+                """Return the list of trace files of the first entry matching the given setup,
+                or None if there are no matching entries"""
+
+                query = (typeofmeasure, command, observerPos, cross_traffic, access_technology,
+                         sender_identity, receiver_identity)
+                try:
+                        return self._selections[query]
+                except KeyError:
+                        pass
+
+                candidates = self._index.get(query[:len(self._INDEX_KEYS)], [])
+                if self._unindexed:
+                        candidates = sorted(candidates + self._unindexed)
+
+                path = None
+                for position in candidates:
+                        elem = self.entries[position]
+                        if MappingCatalog._matches(elem, query) and elem.get("path") != None:
+                                path = elem["path"]
+                                break
+
+                self._selections[query] = path
+                return path
+
+        @staticmethod
+        def _matches(elem, query):
+                typeofmeasure, command, observerPos, cross_traffic, access_technology, \
+                        sender_identity, receiver_identity = query
+
+                for key in elem:
+                        if key == "typeofmeasure" and typeofmeasure != elem[key]:
+                                return False
+                        if key == "command" and command != elem[key]:
+                                return False
+                        if key == "ObserverPos" and observerPos != elem[key]:
+                                return False
+                        if key == "noise" and cross_traffic != elem[key]:
+                                return False
+                        if key == "senderIdentity" and sender_identity != elem[key]:
+                                return False
+                        if key == "receiverIdentity" and receiver_identity != elem[key]:
+                                return False
+                        if key == "access-technology" and access_technology != elem[key]:
+                                return False
+                        if key == "direction" and elem[key] == "downstream":
+                                if (sender_identity == "Client" and receiver_identity == "Observer")  or\
+                                   (sender_identity == "Observer" and receiver_identity == "Server"):
+                                        return False
+                        if key == "direction" and elem[key] == "upstream":
+                                if (sender_identity == "Observer" and receiver_identity == "Client")  or\
+                                   (sender_identity == "Server" and receiver_identity == "Observer"):
+                                        return False
+                        if key == "first-endpoint":
+                                if  elem[key]!=sender_identity and elem[key]!=receiver_identity:
+                                        return False
+
+                return True
+
+class TraceArchive:
+        """Read-only access to the trace files packed in a (compressed) tar archive
+
+        Trace file names, as listed in the mapping file, are resolved relative to the
+        directory containing the archive (e.g., inputFiles/active/x.txt is looked up as
+        the active/x.txt member of inputFiles/active.tar.xz). The member index is built
+        once per archive and the decompressed members are kept in a LRU cache bounded by
+        size, so that only the traces actually used are extracted from the archive.
+
+        Note that xz streams cannot be accessed randomly: reaching a member requires
+        decompressing (and discarding) the data preceding it."""
+
+        DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+        _archives = {}
+        _lock = threading.Lock()
+
+        @classmethod
+        def load(cls, archive_filename):
+                """Return the archive archive_filename, opening and indexing it if needed
+
+                An archive is opened again in a forked process, since a tar file object
+                cannot be shared with the parent process."""
+
+                archive_filename = os.path.abspath(archive_filename)
+                mtime = os.stat(archive_filename).st_mtime_ns
+
+                with cls._lock:
+                        archive = cls._archives.get(archive_filename)
+                        if archive is None or archive.mtime != mtime or archive._pid != os.getpid():
+                                archive = cls(archive_filename, mtime)
+                                cls._archives[archive_filename] = archive
+
+                return archive
+
+        def __init__(self, archive_filename, mtime, max_cache_bytes = DEFAULT_CACHE_BYTES):
+                self.archive_filename = archive_filename
+                self.mtime = mtime
+                self.max_cache_bytes = max_cache_bytes
+
+                self._lock = threading.Lock()
+                self._pid = os.getpid()
+                self._tarfile = tarfile.open(archive_filename, "r:*")
+                self._members = {
+                        os.path.normpath(member.name): member
+                        for member in self._tarfile.getmembers() if member.isfile()}
+                self._cache = OrderedDict()
+                self._cache_bytes = 0
+
+                logging.info(f'trace archive: {len(self._members)} members indexed in {archive_filename}')
+
+        def __contains__(self, trace_filename):
+                return self._resolve(trace_filename) in self._members
+
+        def _resolve(self, trace_filename):
+                return os.path.relpath(
+                        os.path.abspath(trace_filename),
+                        os.path.dirname(self.archive_filename))
+
+        def _member(self, trace_filename):
+                try:
+                        return self._members[self._resolve(trace_filename)]
+                except KeyError:
+                        raise FileNotFoundError(
+                                f'{trace_filename} not found in {self.archive_filename}') from None
+
+        def offset(self, trace_filename):
+                """Return the position of a trace file within the archive: reading trace files
+                by increasing offset avoids decompressing the archive more than once"""
+
+                return self._member(trace_filename).offset_data
+
+        def stat(self, trace_filename):
+                """Return the modification time (in ns) and the size of a trace file"""
+
+                member = self._member(trace_filename)
+                return int(member.mtime) * 1000000000, member.size
+
+        def read(self, trace_filename):
+                """Return the content of a trace file"""
+
+                member = self._member(trace_filename)
+
+                with self._lock:
+                        data = self._cache.get(member.name)
+                        if data != None:
+                                self._cache.move_to_end(member.name)
+                                return data
+
+                        data = self._tarfile.extractfile(member).read()
+
+                        self._cache[member.name] = data
+                        self._cache_bytes += len(data)
+                        while self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+                                _, evicted = self._cache.popitem(last=False)
+                                self._cache_bytes -= len(evicted)
+
+                return data
+
+class TraceCache:
+        """On-disk binary cache of parsed trace files
+
+        Each trace file is stored as a fixed header followed by two packed columns: the
+        sample timestamps (int64, microseconds since the epoch) and the sample values
+        (float64). A cache file is built the first time the trace is read and it is used
+        as long as the modification time and size of the trace file match those recorded
+        in the header. Large cache files are memory-mapped, so that loading a trace does
+        not involve any text parsing."""
+
+        _MAGIC = b"NTMTRACE"
+        _VERSION = 1
+        # magic, version, source mtime (ns), source size, number of samples
+        _HEADER = struct.Struct("<8sI4xqqq")
+        _SUFFIX = ".bin"
+        _MMAP_THRESHOLD = 1 << 16
+        CHUNK_SIZE = 1 << 20
+
+        def __init__(self, cache_dir = None, enabled = True, archive = None):
+                self.cache_dir = cache_dir
+                self.enabled = enabled
+                self.archive = archive
+
+        def cache_filename(self, trace_filename):
+                """Return the name of the cache file of trace_filename: the cache file is
+                placed next to the trace file, unless a cache directory is configured"""
+
+                if self.cache_dir == None:
+                        return trace_filename + self._SUFFIX
+
+                relative_path = os.path.splitdrive(os.path.abspath(trace_filename))[1].lstrip(os.sep)
+                return os.path.join(self.cache_dir, relative_path + self._SUFFIX)
+
+        def load(self, trace_filename):
+                """Return the timestamps and the values of trace_filename as two arrays"""
+
+                if not self.enabled:
+                        return self._parse_source(trace_filename)
+
+                mtime, size = self.stat_source(trace_filename)
+                cache_filename = self.cache_filename(trace_filename)
+
+                arrays = self._read(cache_filename, mtime, size)
+                if arrays != None:
+                        return arrays
+
+                timestamps, values = self._parse_source(trace_filename)
+                self._write(cache_filename, mtime, size, timestamps, values)
+                return timestamps, values
+
+        def stat_source(self, trace_filename):
+                """Return the modification time (in ns) and the size of a trace file"""
+
+                if self.archive != None:
+                        return self.archive.stat(trace_filename)
+
+                stat = os.stat(trace_filename)
+                return stat.st_mtime_ns, stat.st_size
+
+        def _parse_source(self, trace_filename):
+                if self.archive != None:
+                        return TraceCache.parse_stream(
+                                io.TextIOWrapper(io.BytesIO(self.archive.read(trace_filename))))
+
+                return TraceCache.parse(trace_filename)
+
+        @staticmethod
+        def parse(trace_filename):
+                """Parse a text trace file (1 file == 1 line of comma-separated
+                <timestamp>_<value> samples) into two arrays"""
+
+                with open (trace_filename, "r") as input_tracefile:
+                        return TraceCache.parse_stream(input_tracefile)
+
+        @staticmethod
+        def parse_stream(input_stream, chunk_size = CHUNK_SIZE):
+                """Parse the first line of a text stream of comma-separated
+                <timestamp>_<value> samples into two arrays, chunk_size characters at a time
+
+                The arrays are filled as the chunks are parsed, so that the whole line is
+                never held in memory."""
+
+                timestamps = np.empty(0, dtype=np.int64)
+                values = np.empty(0, dtype=np.float64)
+                samples = 0
+                carry = ""
+
+                while True:
+                        chunk = input_stream.read(chunk_size)
+                        end_of_line = not chunk or "\n" in chunk
+                        if end_of_line:
+                                chunk = carry + chunk.split("\n", 1)[0]
+                        else:
+                                # the last sample of the chunk may continue in the next one
+                                chunk, separator, tail = (carry + chunk).rpartition(",")
+                                if not separator:
+                                        carry = tail
+                                        continue
+                                carry = tail
+
+                        chunk_timestamps, chunk_values = TraceCache.parse_line(chunk)
+
+                        if samples + len(chunk_values) > len(values):
+                                capacity = max(2 * len(values), samples + len(chunk_values))
+                                timestamps.resize(capacity, refcheck=False)
+                                values.resize(capacity, refcheck=False)
+                        timestamps[samples:samples + len(chunk_values)] = chunk_timestamps
+                        values[samples:samples + len(chunk_values)] = chunk_values
+                        samples += len(chunk_values)
+
+                        if end_of_line:
+                                break
+
+                timestamps.resize(samples, refcheck=False)
+                values.resize(samples, refcheck=False)
+                return timestamps, values
+
+        @staticmethod
+        def parse_line(line):
+                """Parse a line of comma-separated <timestamp>_<value> samples into an array
+                of timestamps (microseconds since the epoch) and an array of values"""
+
+                # neither the timestamps nor the values contain "_" or ",", hence
+                # timestamps and values alternate once both separators are unified
+                fields = [field.strip() for field in line.replace("_", ",").split(",")]
+                if fields and not fields[-1]:
+                        fields.pop()
+
+                return TraceCache._parse_timestamps(fields[0::2]), \
+                       np.array(fields[1::2], dtype=np.float64)
+
+        @staticmethod
+        def _parse_timestamps(fields):
+                try:
+                        return np.array(fields, dtype="datetime64[us]").astype(np.int64)
+                except ValueError:
+                        # numpy only accepts ISO 8601 timestamps, while strptime also
+                        # accepts non-padded fields (e.g., 19:13:3.98)
+                        return np.array(
+                                [_to_microseconds(datetime.datetime.strptime(field, datetime_format))
+                                 for field in fields],
+                                dtype=np.int64)
+
+        def _read(self, cache_filename, mtime, size):
+                try:
+                        if os.path.getsize(cache_filename) >= self._MMAP_THRESHOLD:
+                                raw = np.memmap(cache_filename, dtype=np.uint8, mode="r")
+                        else:
+                                raw = np.fromfile(cache_filename, dtype=np.uint8)
+                except (OSError, ValueError):
+                        return None
+
+                if len(raw) < self._HEADER.size:
+                        return None
+                magic, version, cached_mtime, cached_size, samples = \
+                        self._HEADER.unpack(bytes(raw[:self._HEADER.size]))
+                if magic != self._MAGIC or version != self._VERSION or \
+                   cached_mtime != mtime or cached_size != size or \
+                   len(raw) != self._HEADER.size + 16 * samples:
+                        logging.info(f'stale trace cache {cache_filename}')
+                        return None
+
+                offset = self._HEADER.size
+                timestamps = raw[offset:offset + 8 * samples].view(np.int64)
+                values = raw[offset + 8 * samples:].view(np.float64)
+                timestamps.flags.writeable = False
+                values.flags.writeable = False
+                return timestamps, values
+
+        def _write(self, cache_filename, mtime, size, timestamps, values):
+                header = self._HEADER.pack(self._MAGIC, self._VERSION, mtime, size, len(timestamps))
+
+                # write to a temporary file and rename it, so that concurrent readers
+                # never see a partially written cache file
+                try:
+                        cache_dirname = os.path.dirname(cache_filename) or "."
+                        os.makedirs(cache_dirname, exist_ok=True)
+                        with tempfile.NamedTemporaryFile(dir=cache_dirname, delete=False) as output:
+                                output.write(header)
+                                output.write(np.ascontiguousarray(timestamps, dtype="<i8").tobytes())
+                                output.write(np.ascontiguousarray(values, dtype="<f8").tobytes())
+                        _replace_file(output.name, cache_filename)
+                except OSError as error:
+                        logging.warning(f'cannot write trace cache {cache_filename}: {error}')
+
+class TraceMetadata:
+        """Statistics of the trace files of a mapping file, stored in a sidecar file
+        (trace_metadata.json) next to the mapping file
+
+        The statistics of a trace file are computed the first time they are needed and they
+        are recomputed only when the modification time or the size of the trace file
+        change, so that traces can be chosen by their statistics without reading them. The
+        sidecar file is shared by the processes using the mapping file (and prefilled by
+        warm_cache.py)."""
+
+        FILENAME = "trace_metadata.json"
+        _VERSION = 1
+
+        # consecutive samples farther apart than this (in seconds) are counted as a gap
+        GAP_THRESHOLD = 30
+        PERCENTILES = (5, 25, 50, 75, 95, 99)
+        FIELDS = ("samples", "duration", "gaps", "min", "max", "mean") + \
+                 tuple(f'p{percentile}' for percentile in PERCENTILES)
+
+        _sidecars = {}
+        _lock = threading.Lock()
+
+        @classmethod
+        def load(cls, mapping_file):
+                """Return the trace metadata of mapping_file, reading the sidecar file if needed"""
+
+                metadata_file = os.path.join(os.path.dirname(os.path.abspath(mapping_file)), cls.FILENAME)
+                try:
+                        mtime = os.stat(metadata_file).st_mtime_ns
+                except OSError:
+                        mtime = None
+
+                with cls._lock:
+                        metadata = cls._sidecars.get(metadata_file)
+                        if metadata is None or metadata.mtime != mtime:
+                                metadata = cls(metadata_file, mtime)
+                                cls._sidecars[metadata_file] = metadata
+
+                return metadata
+
+        def __init__(self, metadata_file, mtime):
+                self.metadata_file = metadata_file
+                self.mtime = mtime
+                self.traces = {}
+                self._dirty = False
+                self._lock = threading.Lock()
+
+                if mtime != None:
+                        try:
+                                with open (metadata_file, "r") as inputjson:
+                                        sidecar = json.load(inputjson)
+                                if sidecar.get("version") == self._VERSION and \
+                                   sidecar.get("gap_threshold") == self.GAP_THRESHOLD:
+                                        self.traces = sidecar["traces"]
+                        except (OSError, ValueError, KeyError) as error:
+                                logging.warning(f'cannot read trace metadata {metadata_file}: {error}')
+
+        def get(self, trace_filename, trace_cache):
+                """Return the statistics of trace_filename, computing them if they are missing
+                or out of date. Call save() to store the new statistics."""
+
+                entry = self.traces.get(trace_filename)
+                try:
+                        mtime, size = trace_cache.stat_source(trace_filename)
+                except OSError:
+                        if entry != None:
+                                return entry
+                        raise
+
+                if entry != None and entry["mtime_ns"] == mtime and entry["size"] == size:
+                        return entry
+
+                entry = TraceMetadata.describe(*trace_cache.load(trace_filename))
+                entry["mtime_ns"] = mtime
+                entry["size"] = size
+
+                with self._lock:
+                        self.traces[trace_filename] = entry
+                        self._dirty = True
+                return entry
+
+        def save(self):
+                """Store the statistics in the sidecar file, if any of them changed"""
+
+                with self._lock:
+                        if not self._dirty:
+                                return
+                        TraceMetadata.write(self.metadata_file, self.traces)
+                        self._dirty = False
+                        try:
+                                self.mtime = os.stat(self.metadata_file).st_mtime_ns
+                        except OSError:
+                                pass
+
+        @staticmethod
+        def write(metadata_file, traces):
+                """Atomically write the statistics of the traces to metadata_file"""
+
+                sidecar = {"version": TraceMetadata._VERSION,
+                           "gap_threshold": TraceMetadata.GAP_THRESHOLD,
+                           "traces": traces}
+                try:
+                        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(metadata_file) or ".",
+                                                         delete=False) as output:
+                                json.dump(sidecar, output, sort_keys=True)
+                        _replace_file(output.name, metadata_file)
+                except OSError as error:
+                        logging.warning(f'cannot write trace metadata {metadata_file}: {error}')
+
+        @staticmethod
+        def describe(timestamps, values):
+                """Return the statistics of a trace: number of samples, duration (seconds),
+                number of gaps, minimum, maximum, mean and percentiles of the values"""
+
+                entry = {field: None for field in TraceMetadata.FIELDS}
+                entry["samples"] = len(values)
+                entry["duration"] = 0.0
+                entry["gaps"] = 0
+                if len(values) == 0:
+                        return entry
+
+                entry["duration"] = int(timestamps[-1] - timestamps[0]) / 1000000
+                entry["gaps"] = int(np.count_nonzero(
+                        np.diff(timestamps) > _seconds_to_microseconds(TraceMetadata.GAP_THRESHOLD)))
+                entry["min"] = float(values.min())
+                entry["max"] = float(values.max())
+                entry["mean"] = float(values.mean())
+                for percentile, value in zip(TraceMetadata.PERCENTILES,
+                                             np.percentile(values, TraceMetadata.PERCENTILES)):
+                        entry[f'p{percentile}'] = float(value)
+
+                return entry
+
+class _BaseTrace:
+        """A trace as read from file, shared by all the NetworkTraceManager instances
+
+        Base traces are kept in a process-wide pool, keyed by trace file, and they are
+        read-only: each instance only stores the rotation and the cursor it applies to a
+        base trace (see _Trace). Besides the timestamps (in microseconds since the epoch)
+        and the values, a base trace keeps its compacted timestamps for each
+        max_tracegap used so far."""
+
+        __slots__ = ("filename", "source", "timestamps", "values", "_compacted")
+
+        _pool = {}
+        _lock = threading.Lock()
+
+        @classmethod
+        def load(cls, trace_cache, trace_filename):
+                """Return the base trace of trace_filename, reading it through trace_cache if
+                it is not in the pool or if the trace file has changed"""
+
+                key = cls.key(trace_cache, trace_filename)
+                source = trace_cache.stat_source(trace_filename)
+
+                with cls._lock:
+                        base = cls._pool.get(key)
+                        if base != None and base.source == source:
+                                return base
+
+                timestamps, values = trace_cache.load(trace_filename)
+                base = cls(trace_filename, source, timestamps, values)
+
+                with cls._lock:
+                        cls._pool[key] = base
+
+                return base
+
+        @staticmethod
+        def key(trace_cache, trace_filename):
+                """Return the key identifying trace_filename, as read through trace_cache"""
+
+                archive = trace_cache.archive
+                return (archive.archive_filename if archive != None else None, os.path.abspath(trace_filename))
+
+        @classmethod
+        def clear(cls):
+                """Empty the pool"""
+
+                with cls._lock:
+                        cls._pool.clear()
+                _rotated.cache_clear()
+                _resample.cache_clear()
+
+        def __init__(self, filename, source, timestamps, values):
+                timestamps.flags.writeable = False
+                values.flags.writeable = False
+
+                self.filename = filename
+                self.source = source
+                self.timestamps = timestamps
+                self.values = values
+                self._compacted = {}
+
+        def __len__(self):
+                return len(self.values)
+
+        def compacted(self, max_tracegap):
+                """Return the timestamps shifted so that two consecutive samples are
+                max_tracegap microseconds apart at most"""
+
+                compacted_timestamps = self._compacted.get(max_tracegap)
+                if compacted_timestamps is None:
+                        compacted_timestamps = self.timestamps - \
+                                _BaseTrace.compaction_offsets(self.timestamps, max_tracegap)
+                        compacted_timestamps.flags.writeable = False
+                        self._compacted[max_tracegap] = compacted_timestamps
+
+                return compacted_timestamps
+
+        @staticmethod
+        def compaction_offsets(timestamps, max_tracegap):
+                """Return the cumulative time exceeding max_tracegap between consecutive
+                samples, up to each sample"""
+
+                excess = np.diff(timestamps) - max_tracegap
+                np.maximum(excess, 0, out=excess)
+
+                offsets = np.zeros(len(timestamps), dtype=np.int64)
+                np.cumsum(excess, out=offsets[1:])
+                offsets.flags.writeable = False
+                return offsets
+
+class _Trace:
+        """A base trace rotated at its starting element and compacted
+
+        The elements from the starting one onward keep their relative position, while the
+        elements preceding the starting one are placed after the last element, so as to
+        pretend that they have been obtained _after_ that (looping). The rotation is not
+        materialized: relative timestamps are mapped to the elements of the base trace
+        arithmetically. The starting element keeps its absolute timestamp (start)."""
+
+        __slots__ = ("base", "starting_item", "max_tracegap", "start", "period", "_compacted", "_head")
+
+        def __init__(self, base, starting_item, max_tracegap):
+                self.base = base
+                self.starting_item = starting_item
+                self.max_tracegap = max_tracegap
+                self.start = int(base.timestamps[starting_item])
+
+                compacted = base.compacted(max_tracegap)
+                self._compacted = compacted
+
+                # relative timestamp of the last element, and of the first looped one
+                self._head = int(compacted[-1] - compacted[starting_item])
+
+                # time after which the trace loops, in microseconds (a trace whose samples
+                # share the same timestamp, with no gap allowed, would loop forever within
+                # the same instant)
+                last = self._head + (int(compacted[starting_item - 1] - compacted[0]) if starting_item > 0 else 0)
+                self.period = max(last + max_tracegap, 1)
+
+        def __len__(self):
+                return len(self.base)
+
+        def __repr__(self):
+                return f'_Trace({self.base.filename}, {len(self)} samples, start {_to_datetime(self.start)})'
+
+        def locate(self, timestamp):
+                """Return the index (within the base trace) of the sample in effect at the given
+                relative timestamp, that is, the last sample whose timestamp does not exceed
+                it, once the timestamp is reported within the first loop of the trace"""
+
+                timestamp %= self.period
+                compacted = self._compacted
+
+                if self.starting_item > 0 and timestamp >= self._head:
+                        return int(np.searchsorted(
+                                compacted[:self.starting_item],
+                                compacted[0] + timestamp - self._head,
+                                side="right")) - 1
+
+                return self.starting_item + int(np.searchsorted(
+                        compacted[self.starting_item:],
+                        compacted[self.starting_item] + timestamp,
+                        side="right")) - 1
+
+        def locate_many(self, timestamps):
+                """Vectorized version of locate(), for an array of relative timestamps"""
+
+                timestamps = timestamps % self.period
+                compacted = self._compacted
+
+                indexes = self.starting_item - 1 + np.searchsorted(
+                        compacted[self.starting_item:],
+                        compacted[self.starting_item] + timestamps,
+                        side="right")
+                if self.starting_item > 0:
+                        looped = timestamps >= self._head
+                        indexes[looped] = np.searchsorted(
+                                compacted[:self.starting_item],
+                                compacted[0] + timestamps[looped] - self._head,
+                                side="right") - 1
+
+                return indexes
+
+        def rotated(self):
+                """Return the relative timestamps (in microseconds) and the values of the
+                rotated trace (read-only, memoized)"""
+
+                timestamps, _, values = _rotated(self.base, self.starting_item, self.max_tracegap)
+                return timestamps, values
+
+        def rotated_seconds(self):
+                """Return the relative timestamps (in seconds) and the values of the rotated
+                trace (read-only, memoized)"""
+
+                _, timestamps, values = _rotated(self.base, self.starting_item, self.max_tracegap)
+                return timestamps, values
+
+        def resample(self, period, mode):
+                """Return the values of the rotated trace over one full loop, on a grid of
+                instants period microseconds apart starting from 0 (read-only, memoized)"""
+
+                return _resample(self.base, self.starting_item, self.max_tracegap, period, mode)
+
+ROTATED_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=ROTATED_CACHE_SIZE)
+def _rotated(base, starting_item, max_tracegap):
+        trace = _Trace(base, starting_item, max_tracegap)
+        compacted = trace._compacted
+        values = base.values
+
+        timestamps = np.concatenate((
+                compacted[starting_item:] - compacted[starting_item],
+                trace._head + compacted[:starting_item] - compacted[0]))
+        timestamps.flags.writeable = False
+
+        seconds = timestamps / 1000000
+        seconds.flags.writeable = False
+
+        if starting_item > 0:
+                values = np.concatenate((values[starting_item:], values[:starting_item]))
+                values.flags.writeable = False
+
+        return timestamps, seconds, values
+
+RESAMPLE_MODES = ("step", "linear", "nearest")
+RESAMPLE_CACHE_SIZE = 256
+
+@functools.lru_cache(maxsize=RESAMPLE_CACHE_SIZE)
+def _resample(base, starting_item, max_tracegap, period, mode):
+        trace = _Trace(base, starting_item, max_tracegap)
+        grid = np.arange(0, trace.period, period, dtype=np.int64)
+
+        if mode == "step":
+                # the same values get_rtt() (get_bandwidth()) would return at those instants
+                resampled = base.values[trace.locate_many(grid)]
+        else:
+                timestamps, values = trace.rotated()
+
+                # only the last of the samples sharing the same timestamp is ever in effect;
+                # the first sample is met again when the trace loops
+                last = np.append(timestamps[1:] != timestamps[:-1], True)
+                timestamps = np.append(timestamps[last], trace.period)
+                values = np.append(values[last], values[0])
+
+                if mode == "linear":
+                        resampled = np.interp(grid, timestamps, values)
+                else:
+                        following = np.searchsorted(timestamps, grid, side="left")
+                        preceding = np.maximum(following - 1, 0)
+                        closer = timestamps[following] - grid < grid - timestamps[preceding]
+                        resampled = values[np.where(closer, following, preceding)]
+
+        resampled.flags.writeable = False
+        return resampled
+
 class NetworkTraceManager:
         __OK = 0
         __WRONG_CONFIGURATION = -1
@@ -20,142 +1019,250 @@ class NetworkTraceManager:
         @staticmethod
         def get_tracelist(mapping_file, typeofmeasure = None, first_endpoint = None, second_endpoint = None,
                           direction = None, command = None, noise = None, observerPos = None, 
-                          access_technology = None):
-                trace_list = []
-
-                with open (mapping_file, "r") as inputjson:
-                        data = json.load(inputjson)
+                          access_technology = None, trace_filter = None, sort_by = None,
+                          trace_cache_dir = None, trace_archive = None):
+                """Return the configurations of the mapping file matching the given parameters,
+                as read-only records. Each parameter is a value, a set of allowed values or None
+                (any value)
+
+                If trace_filter or sort_by are given, a record is returned for each trace file of
+                the matching configurations instead, including its path and its statistics (see
+                TraceMetadata.FIELDS). trace_filter maps statistics to (minimum, maximum) ranges,
+                either bound being None, and sort_by is the statistic to sort the trace files by
+                (in descending order, if prefixed by "-"). The trace files missing from the
+                statistics are read as NetworkTraceManager does, from trace_archive (if given)
+                and through the binary cache in trace_cache_dir; those that cannot be read are
+                skipped."""
+
+                catalog = MappingCatalog.load(mapping_file)
+                allowed_values = (typeofmeasure, first_endpoint, second_endpoint, direction, command,
+                                  noise, observerPos, access_technology)
+
+                if trace_filter == None and sort_by == None:
+                        return list(catalog.tracelist(*allowed_values))
+
+                trace_filter = trace_filter or {}
+                for field in list(trace_filter) + ([sort_by.lstrip("-")] if sort_by != None else []):
+                        if field not in TraceMetadata.FIELDS:
+                                raise ValueError(f'Unknown trace statistic {field!r}, expected one of '
+                                                 f'{", ".join(TraceMetadata.FIELDS)}')
+
+                metadata = TraceMetadata.load(mapping_file)
+                trace_cache = TraceCache(
+                        trace_cache_dir, True, TraceArchive.load(trace_archive) if trace_archive else None)
 
-                for elem in data:
-                        config = {}
-                        discard_elem = False
-                        for key in elem :
-                                if discard_elem == True:
+                trace_list = []
+                for record, paths in catalog.trace_files(*allowed_values):
+                        for trace_filename in paths:
+                                try:
+                                        statistics = metadata.get(trace_filename, trace_cache)
+                                except (OSError, ValueError) as error:
+                                        logging.warning(f'cannot read trace {trace_filename}: {error}')
                                         continue
 
-                                if key == "typeofmeasure":
-                                        if typeofmeasure != None and typeofmeasure != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_typeofmeasure = elem[key]
-                                if key == "command":
-                                        if command != None and command != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_command = elem[key]    
-                                if key == "direction":
-                                        if direction != None and elem[key] != None and direction != elem[key]:
-                                                discard_elem = True
-                                                continue
-                                                
-                                        if elem[key] != None:
-                                                curr_direction = elem[key]
-                                        else:
-                                                curr_direction = None
-                                if key == "ObserverPos":                                        
-                                        if observerPos != None and observerPos != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_observerPos = elem[key]
-                                if key == "noise":
-                                        if noise != None and noise != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_noise = elem[key]
-                                if key == "senderIdentity":              
-                                        if first_endpoint != None and first_endpoint != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_senderIdentity  = elem[key]
-                                if key == "receiverIdentity":
-                                        if second_endpoint != None and second_endpoint != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_receiverIdentity = elem[key]
-                                if key == "access-technology":
-                                        if access_technology != None and access_technology != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_accesstech = elem[key]
-                                if key == "path":
-                                        pass
-
-                                if key == "first-endpoint":              
-                                        if first_endpoint != None and first_endpoint != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_firstendpoint  = elem[key]
-                                if key == "second-endpoint":
-                                        if second_endpoint != None and second_endpoint != elem[key]:
-                                                discard_elem = True
-                                                continue
-
-                                        curr_secondendpoint = elem[key]
-                                        
-                        if discard_elem != True:
-                                if "RTT" in curr_command  and curr_direction != None:
-                                        continue
-                                
-                                config['typeofmeasure'] = curr_typeofmeasure
-                                config['command'] = curr_command
-                                config['ObserverPos'] = curr_observerPos
-                                config['noise'] = curr_noise
-                                config['access-technology'] = curr_accesstech
-
-                                if "TCPBandwidth" in curr_command or "UDPBandwidth" in curr_command: 
-                                        config['direction'] = curr_direction
-                                        config['senderIdentity'] = curr_senderIdentity
-                                        config['receiverIdentity'] = curr_receiverIdentity
-
-                                elif "TCPRTT" in curr_command or "UDPRTT" in curr_command: 
-                                        config['first-endpoint'] = curr_firstendpoint
-                                        config['second-endpoint'] = curr_secondendpoint
-
-                                trace_list.append(config)
-                
+                                if all(NetworkTraceManager._in_range(statistics.get(field), low, high)
+                                       for field, (low, high) in trace_filter.items()):
+                                        trace_list.append(MappingProxyType({
+                                                **record,
+                                                'path': trace_filename,
+                                                **{field: statistics[field] for field in TraceMetadata.FIELDS}}))
+                metadata.save()
+
+                if sort_by != None:
+                        # trace files lacking the statistic (i.e., empty ones) come last anyway
+                        field = sort_by.lstrip("-")
+                        missing = [record for record in trace_list if record[field] == None]
+                        trace_list = sorted((record for record in trace_list if record[field] != None),
+                                            key=lambda record: record[field],
+                                            reverse=sort_by.startswith("-")) + missing
+
                 return trace_list
 
+        @staticmethod
+        def _in_range(value, low, high):
+                return value != None and (low == None or value >= low) and (high == None or value <= high)
+
         def __init__(self, config):
+                self._initialize(config)
+
+                # in lazy mode, the RTT trace is read on first use
+                if not self._config.lazy:
+                        self._get_rtt_trace()
+
+        @classmethod
+        def bulk(cls, configs):
+                """Return a NetworkTraceManager for each configuration in configs
+
+                The instances are the same as if they were built one by one (same trace files,
+                same starting items, hence same results), but each mapping file is loaded once
+                and each distinct trace file is read once."""
+
+                catalogs = {}
+                managers = []
+                for config in configs:
+                        manager = cls.__new__(cls)
+                        manager._initialize(config, catalogs)
+                        managers.append(manager)
+
+                base_traces = {}
+                for manager in managers:
+                        if manager._config.lazy:
+                                continue
+
+                        key = _BaseTrace.key(manager._trace_cache, manager._rtt_tracefile)
+                        if key not in base_traces:
+                                base_traces[key] = _BaseTrace.load(manager._trace_cache, manager._rtt_tracefile)
+                        manager._get_rtt_trace(base_traces[key])
+
+                logging.info(f'{len(managers)} NetworkTraceManager instances built from '
+                             f'{len(catalogs)} mapping files and {len(base_traces)} trace files')
+                return managers
+
+        def snapshot(self):
+                """Return the state of the instance as a compact, JSON-serializable dictionary:
+                the configuration, the trace files with their starting items, the positions
+                within the traces and the state of the random generators"""
+
+                self._throw_if_invalid()
+
+                return {
+                        "version": 1,
+                        "config": dataclasses.asdict(self._config),
+                        "rtt": NetworkTraceManager._cursor_snapshot(
+                                self._rtt_tracefile, self._rtt_trace, self._rtt_index, self._rtt_timestamp),
+                        "bandwidth": NetworkTraceManager._cursor_snapshot(
+                                self._bandwidth_tracefile, self._bandwidth_trace,
+                                self._bandwidth_index, self._bandwidth_timestamp),
+                        "random": {
+                                "trace": NetworkTraceManager._random_snapshot(self._tracerandomgenerator),
+                                "starting_item": NetworkTraceManager._random_snapshot(
+                                        self._startingitemrandomgenerator)}}
+
+        @classmethod
+        def restore(cls, snapshot):
+                """Return an instance in the state captured by snapshot()
+
+                The mapping file is not read again and the traces are taken from the pool of
+                the traces already read, if possible. An InvalidConfiguration exception is
+                raised if a trace file has changed since the snapshot was taken."""
+
+                if snapshot.get("version") != 1:
+                        logging.error("Error: unknown snapshot version")
+                        raise InvalidConfiguration
+
+                manager = cls.__new__(cls)
+                manager._status = cls.__OK
+                manager._config = TraceConfig(**snapshot["config"])
+                manager._catalog = None
+                manager._trace_cache = TraceCache(
+                        manager._config.trace_cache_dir,
+                        manager._config.trace_cache,
+                        TraceArchive.load(manager._config.trace_archive) if manager._config.trace_archive else None)
+
+                manager._tracerandomgenerator = NetworkTraceManager._random_restore(snapshot["random"]["trace"])
+                manager._startingitemrandomgenerator = NetworkTraceManager._random_restore(
+                        snapshot["random"]["starting_item"])
+                manager._sharedrandomgenerators = False
+
+                manager._rtt_tracefile, manager._rtt_trace, manager._rtt_index, manager._rtt_timestamp = \
+                        manager._cursor_restore(snapshot["rtt"])
+                manager._bandwidth_tracefile, manager._bandwidth_trace, manager._bandwidth_index, \
+                        manager._bandwidth_timestamp = manager._cursor_restore(snapshot["bandwidth"])
+
+                return manager
+
+        def fork(self):
+                """Return an independent instance in the same state as this one
+
+                The fork shares the (read-only) traces, the configuration and the trace
+                selection with this instance, while it owns its position within the traces and
+                its random generators: pushing either instance forward does not affect the
+                other one."""
+
+                self._throw_if_invalid()
+
+                # the random generators are only drawn from when a trace is selected or read
+                # (never, once the RTT trace has been read), hence they are shared until then
+                # and copied by the first of the two instances drawing from them
+                manager = copy.copy(self)
+                self._sharedrandomgenerators = True
+                manager._sharedrandomgenerators = True
+                return manager
+
+        @staticmethod
+        def _cursor_snapshot(trace_filename, trace, index, timestamp):
+                return {
+                        "file": trace_filename,
+                        # None if the trace has not been read yet
+                        "source": list(trace.base.source) if trace is not None else None,
+                        "starting_item": trace.starting_item if trace is not None else None,
+                        "index": int(index),
+                        "timestamp": int(timestamp)}
+
+        def _cursor_restore(self, cursor):
+                trace = None
+                if cursor["starting_item"] != None:
+                        base = _BaseTrace.load(self._trace_cache, cursor["file"])
+                        if list(base.source) != cursor["source"]:
+                                logging.error(f'Error: {cursor["file"]} has changed since the snapshot')
+                                raise InvalidConfiguration
+                        trace = _Trace(base, cursor["starting_item"], self._config.max_tracegap_seconds * 1000000)
+
+                return cursor["file"], trace, cursor["index"], cursor["timestamp"]
+
+        @staticmethod
+        def _random_snapshot(randomgenerator):
+                version, internalstate, gauss_next = randomgenerator.getstate()
+                return [version, list(internalstate), gauss_next]
+
+        @staticmethod
+        def _random_restore(state):
+                randomgenerator = random.Random()
+                randomgenerator.setstate((state[0], tuple(state[1]), state[2]))
+                return randomgenerator
+
+        def _initialize(self, config, catalogs = None):
+                """Validate the configuration (a TraceConfig, a configparser section or a
+                dictionary) and select the trace files: if catalogs (a dictionary of the
+                mapping catalogs by mapping file) is given, the catalogs are taken from and
+                stored into it"""
+
                 self._status = self.__OK
-                self._rtt_trace = []
+                self._rtt_trace = None
+                self._rtt_tracefile = None
                 self._rtt_index = 0
-                self._rtt_timestamp = None
-                self._bandwidth_trace = []
+                self._rtt_timestamp = 0
+                self._bandwidth_trace = None
+                self._bandwidth_tracefile = None
                 self._bandwidth_index = 0    
-                self._bandwidth_timestamp = None            
-                self._instanceconfiguration = config
+                self._bandwidth_timestamp = 0
+                self._config = config if isinstance(config, TraceConfig) else TraceConfig.from_config(config)
                 self._tracerandomgenerator = None
                 self._startingitemrandomgenerator = None
+                self._sharedrandomgenerators = False
+                self._catalog = None
 
                 self._check__instanceconfiguration()
-                self.print_instanceconfiguration()
+                self._throw_if_invalid()
+                self._trace_cache = TraceCache(
+                        self._config.trace_cache_dir,
+                        self._config.trace_cache,
+                        TraceArchive.load(self._config.trace_archive) if self._config.trace_archive else None)
+                if catalogs != None:
+                        mapping_file = self._config.mapping_file
+                        if mapping_file not in catalogs:
+                                catalogs[mapping_file] = MappingCatalog.load(mapping_file)
+                        self._catalog = catalogs[mapping_file]
                 
-                #initialize the random generator
-                random.seed(self._instanceconfiguration.getint("traceseed"))
-                self._tracerandomgenerator = random.getstate()
-                random.seed(self._instanceconfiguration.getint("startingitemseed"))
-                self._startingitemrandomgenerator = random.getstate()
+                #initialize the random generators (each instance owns its generators,
+                #so that instances can be built concurrently)
+                self._tracerandomgenerator = random.Random(self._config.traceseed)
+                self._startingitemrandomgenerator = random.Random(self._config.startingitemseed)
 
                 self._get_traces()
                 
                 self._throw_if_invalid()
 
-                self._rtt_timestamp = self._rtt_trace[0]["timestamp"]
-                #self._bandwidth_timestamp = self._bandwidth_trace[0]["timestamp"]
-
-                logging.info("rtt: " + str(self._rtt_trace))
-                logging.info("_rtt_timestamp: " + str(self._rtt_timestamp))
-                #logging.info("bandwidth: " + str(self._bandwidth_trace))
-                #logging.info("_bandwidth_timestamp: " + str(self._bandwidth_timestamp))
-
         def _throw_if_invalid(self):
                 """Throw an exception if the current status is not OK"""
 
@@ -167,165 +1274,360 @@ class NetworkTraceManager:
 
                 self._throw_if_invalid()
 
-                trace_list = self.get_tracelist(self._instanceconfiguration.get('mapping_file'))
+                return set(MappingCatalog.load(self._config.mapping_file).facet(field_type))
 
-                ret = set()
-                for elem in trace_list:
-                        for k, v in elem.items():
-                                if k == field_type:
-                                        ret.add(v)
+        @staticmethod
+        def facet_counts(mapping_file, field_type = None):
+                """Return the number of configurations of the mapping file having each possible
+                value of a given field type, or of every field type if field_type is None"""
 
-                return ret
+                return MappingCatalog.load(mapping_file).facet_counts(field_type)
 
-        def get_rtt_timeseries(self):
+        def get_rtt_timeseries(self, as_arrays = False):
                 """Return the full RTT timeseries as two vectors of equal size: the first vector
                 contains the timestamp of the i-th sample, in seconds starting from 0, the second
-                vector contains the RTT of the i-th sample"""
+                vector contains the RTT of the i-th sample
+
+                If as_arrays is True, the vectors are returned as read-only numpy arrays, which
+                are built once per trace file, starting item and max_tracegap, and then shared."""
+
+                self._throw_if_invalid()
 
                 return NetworkTraceManager._get_timeseries(
-                        self._rtt_trace,
-                        'rtt')
+                        self._get_rtt_trace(),
+                        'rtt',
+                        as_arrays)
 
-        def get_bandwidth_timeseries(self):
+        def get_bandwidth_timeseries(self, as_arrays = False):
                 """Return the full bandwidth timeseries as two vectors of equal size: the first vector
                 contains the timestamp of the i-th sample, in seconds starting from 0, the second
-                vector contains the bandwidth of the i-th sample"""
+                vector contains the bandwidth of the i-th sample
+
+                If as_arrays is True, the vectors are returned as read-only numpy arrays, which
+                are built once per trace file, starting item and max_tracegap, and then shared."""
+
+                self._throw_if_invalid()
 
                 return NetworkTraceManager._get_timeseries(
-                        self._bandwidth_trace,
-                        'bandwidth')
+                        self._get_bandwidth_trace(),
+                        'bandwidth',
+                        as_arrays)
 
         @staticmethod
-        def _get_timeseries(trace, trace_type):
-                timestamps = []
-                values = []
+        def _get_timeseries(trace, trace_type, as_arrays):
+                assert trace_type in ['rtt', 'bandwidth']
+                assert trace is not None and len(trace) > 0
+
+                timestamps, values = trace.rotated_seconds()
+                if as_arrays:
+                        return [timestamps, values]
+
+                return [timestamps.tolist(), values.tolist()]
+
+        def resample(self, period, mode = 'step', trace_type = 'rtt'):
+                """Return the RTT (or bandwidth) values over one full loop of the trace on a
+                fixed grid, one every period seconds starting from 0, as a read-only numpy array
+
+                mode is one of 'step' (the value in effect, as get_rtt() would return),
+                'linear' (linear interpolation) or 'nearest' (the value of the nearest sample).
+                The result is memoized, and shared among the instances using the same trace."""
 
                 assert trace_type in ['rtt', 'bandwidth']
-                assert len(trace) > 0
-                assert 'timestamp' in trace[0]
+                assert mode in RESAMPLE_MODES
+                period = _seconds_to_microseconds(period)
+                assert period > 0
+                self._throw_if_invalid()
 
-                first_timestamp = trace[0]['timestamp']
-                for elem in trace:
-                        assert 'timestamp' in elem
-                        assert trace_type in elem
+                trace, _ = self._get_cursor(trace_type)
+                return trace.resample(period, mode)
 
-                        timestamps.append((elem['timestamp'] - first_timestamp).total_seconds())
-                        values.append(float(elem[trace_type]))
-                
-                return [timestamps, values]
+        @staticmethod
+        def _sample(trace, index, timestamp):
+                return float(trace.base.values[index]), \
+                       _to_datetime(trace.start + timestamp), \
+                       _to_datetime(trace.base.timestamps[index])
 
         def get_rtt(self, sec):
                 self._throw_if_invalid()
- 
-                while (True):
-                        next_index = (self._rtt_index + 1) % len(self._rtt_trace)
-                        if next_index != 0:
-                                next_timestamp = self._rtt_trace[self._rtt_index + 1]["timestamp"]
-                        else:
-                                max_tracegap = self._instanceconfiguration.getint("max_tracegap_seconds")
-                                next_timestamp = self._rtt_trace[-1]["timestamp"] + \
-                                                 datetime.timedelta(seconds=max_tracegap)
 
+                rtt_trace = self._get_rtt_trace()
+                self._rtt_timestamp += _seconds_to_microseconds(sec)
+                self._rtt_index = rtt_trace.locate(self._rtt_timestamp)
 
-                        if self._rtt_timestamp + datetime.timedelta(seconds=sec) >= next_timestamp:
-                                self._rtt_index = next_index
+                return NetworkTraceManager._sample(rtt_trace, self._rtt_index, self._rtt_timestamp)
 
-                                if next_index == 0:
-                                        diff_seconds = (self._rtt_trace[-1]["timestamp"] -
-                                                        self._rtt_trace[0]["timestamp"]  + 
-                                                        datetime.timedelta(seconds=max_tracegap)).total_seconds()
-                                        for elem in self._rtt_trace:
-                                                elem["timestamp"] = elem["timestamp"] + \
-                                                                    datetime.timedelta(seconds=diff_seconds)
+        def get_bandwidth(self, sec):
+                self._throw_if_invalid()
 
-                                        logging.info("rrt: " + str(self._rtt_trace))
+                bandwidth_trace = self._get_bandwidth_trace()
+                self._bandwidth_timestamp += _seconds_to_microseconds(sec)
+                self._bandwidth_index = bandwidth_trace.locate(self._bandwidth_timestamp)
 
+                return NetworkTraceManager._sample(
+                        bandwidth_trace, self._bandwidth_index, self._bandwidth_timestamp)
 
-                        next_index = (self._rtt_index + 1) % len(self._rtt_trace)
-                        if next_index != 0:
-                                next_timestamp = self._rtt_trace[self._rtt_index + 1]["timestamp"]
-                        else:
-                                max_tracegap = self._instanceconfiguration.getint("max_tracegap_seconds")
-                                next_timestamp = self._rtt_trace[-1]["timestamp"] + \
-                                                 datetime.timedelta(seconds=max_tracegap)
-        
-                        if self._rtt_timestamp + datetime.timedelta(seconds=sec) < next_timestamp:
-                                self._rtt_timestamp += datetime.timedelta(seconds=sec)
-                
-                                return self._rtt_trace[self._rtt_index]["rtt"], self._rtt_timestamp, \
-                                       self._rtt_trace[self._rtt_index]["absolute_timestamp"]
+        @staticmethod
+        def _sample_offsets(times, incremental, timestamp):
+                """Return the relative timestamps, in microseconds, at which a trace is sampled:
+                times are either offsets from the starting element or, if incremental is True,
+                successive steps from the given timestamp"""
+
+                offsets = _seconds_to_microseconds_array(times)
+                if incremental:
+                        offsets = timestamp + np.cumsum(offsets)
+
+                return offsets
+
+        @staticmethod
+        def _sample_many(trace, offsets):
+                indexes = trace.locate_many(offsets)
+
+                return trace.base.values[indexes], \
+                       trace.base.timestamps[indexes].astype("datetime64[us]")
+
+        def sample_rtt(self, times, incremental = False):
+                """Return the RTT values at many instants at once, and the timestamps originally
+                associated with them, as two arrays
+
+                The instants are given in seconds, either as offsets from the starting element
+                of the trace (i.e., the time axis of get_rtt_timeseries()) or, if incremental
+                is True, as the arguments of successive get_rtt() calls: in the latter case
+                the trace is also pushed forward as get_rtt() would do."""
 
-        def get_bandwidth(self, sec):
                 self._throw_if_invalid()
 
-                while (True):
-                        next_index = (self._bandwidth_index + 1) % len(self._bandwidth_trace)
-                        if next_index != 0:
-                                next_timestamp = self._bandwidth_trace[self._bandwidth_index + 1]["timestamp"]
-                        else:
-                                max_tracegap = self._instanceconfiguration.getint("max_tracegap_seconds")
-                                next_timestamp = self._bandwidth_trace[-1]["timestamp"] + \
-                                                 datetime.timedelta(seconds=max_tracegap)
+                rtt_trace = self._get_rtt_trace()
+                offsets = NetworkTraceManager._sample_offsets(times, incremental, self._rtt_timestamp)
+                if incremental and len(offsets) > 0:
+                        self._rtt_timestamp = int(offsets[-1])
+                        self._rtt_index = rtt_trace.locate(self._rtt_timestamp)
 
+                return NetworkTraceManager._sample_many(rtt_trace, offsets)
 
-                        if self._bandwidth_timestamp + datetime.timedelta(seconds=sec) >= next_timestamp:
-                                self._bandwidth_index = next_index
+        def sample_bandwidth(self, times, incremental = False):
+                """Return the bandwidth values at many instants at once, and the timestamps
+                originally associated with them, as two arrays, see sample_rtt()"""
 
-                                if next_index == 0:
-                                        diff_seconds = (self._bandwidth_trace[-1]["timestamp"] -
-                                                        self._bandwidth_trace[0]["timestamp"]  + 
-                                                        datetime.timedelta(seconds=max_tracegap)).total_seconds()
-                                        for elem in self._bandwidth_trace:
-                                                elem["timestamp"] = elem["timestamp"] + \
-                                                                    datetime.timedelta(seconds=diff_seconds)
+                self._throw_if_invalid()
 
-                                        logging.info(self._bandwidth_trace)
+                bandwidth_trace = self._get_bandwidth_trace()
+                offsets = NetworkTraceManager._sample_offsets(times, incremental, self._bandwidth_timestamp)
+                if incremental and len(offsets) > 0:
+                        self._bandwidth_timestamp = int(offsets[-1])
+                        self._bandwidth_index = bandwidth_trace.locate(self._bandwidth_timestamp)
 
+                return NetworkTraceManager._sample_many(bandwidth_trace, offsets)
 
-                        next_index2 = (self._bandwidth_index + 1) % len(self._bandwidth_trace)
-                        if next_index2 != 0:
-                                next_timestamp2 = self._bandwidth_trace[self._bandwidth_index + 1]["timestamp"]
-                        else:
-                                max_tracegap = self._instanceconfiguration.getint("max_tracegap_seconds")
-                                next_timestamp2 = self._bandwidth_trace[-1]["timestamp"] + \
-                                                  datetime.timedelta(seconds=max_tracegap)
+        def iter_rtt(self, step, chunk_size = None):
+                """Return an iterator over the RTT values obtained by pushing forward the RTT
+                trace by step seconds indefinitely, without moving the instance: the values are
+                those of successive get_rtt(step) calls
 
-        
-                        if self._bandwidth_timestamp + datetime.timedelta(seconds=sec) < next_timestamp2:
-                                self._bandwidth_timestamp += datetime.timedelta(seconds=sec)
-                
-                                return self._bandwidth_trace[self._bandwidth_index]["bandwidth"], \
-                                       self._bandwidth_timestamp, \
-                                       self._bandwidth_trace[self._bandwidth_index]["absolute_timestamp"]
+                If chunk_size is given, the iterator yields arrays of chunk_size values instead.
+                The array is preallocated and overwritten at every iteration: copy it to
+                keep it."""
+
+                self._throw_if_invalid()
+
+                return NetworkTraceManager._iter_values(
+                        self._get_rtt_trace(), self._rtt_timestamp, step, chunk_size)
+
+        def iter_bandwidth(self, step, chunk_size = None):
+                """Return an iterator over the bandwidth values obtained by pushing forward the
+                bandwidth trace by step seconds indefinitely, as iter_rtt() does"""
+
+                self._throw_if_invalid()
+
+                return NetworkTraceManager._iter_values(
+                        self._get_bandwidth_trace(), self._bandwidth_timestamp, step, chunk_size)
+
+        def iter_samples(self, trace_type = 'rtt', chunk_size = None):
+                """Return an iterator over the samples of the RTT (or bandwidth) trace, looping
+                indefinitely: each sample is a pair (time in seconds from the beginning of the
+                trace, value)
+
+                If chunk_size is given, the iterator yields pairs of arrays of chunk_size
+                samples each instead. The arrays are preallocated and overwritten at every
+                iteration: copy them to keep them."""
+
+                assert trace_type in ['rtt', 'bandwidth']
+                self._throw_if_invalid()
+
+                trace, _ = self._get_cursor(trace_type)
+
+                if chunk_size == None:
+                        return NetworkTraceManager._iter_samples(trace)
+
+                return NetworkTraceManager._iter_sample_chunks(trace, chunk_size)
+
+        def get_position(self, trace_type = 'rtt'):
+                """Return the RTT (or bandwidth) trace and the current position within it,
+                without pushing the trace forward: the timestamps of the samples over one loop
+                of the trace and their values (read-only arrays), the duration of a loop and
+                the current timestamp. Timestamps are in microseconds from the beginning of the
+                trace, the current one growing across loops."""
+
+                assert trace_type in ['rtt', 'bandwidth']
+                self._throw_if_invalid()
+
+                trace, timestamp = self._get_cursor(trace_type)
+                timestamps, values = trace.rotated()
+                return timestamps, values, trace.period, timestamp
+
+        @staticmethod
+        def _iter_values(trace, timestamp, step, chunk_size = None):
+                """Iterate over the values of a trace at timestamp + step, timestamp + 2 * step,
+                and so on (timestamp being relative to the trace)"""
+
+                step = _seconds_to_microseconds(step)
+                timestamps, values = trace.rotated()
+
+                if chunk_size == None:
+                        return NetworkTraceManager._iter_single_values(
+                                timestamps.tolist(), values.tolist(), trace.period, timestamp, step)
+
+                return NetworkTraceManager._iter_value_chunks(
+                        timestamps, values, trace.period, timestamp, step, chunk_size)
+
+        @staticmethod
+        def _iter_single_values(timestamps, values, period, timestamp, step):
+                timestamp %= period
+                step %= period
+
+                while True:
+                        timestamp += step
+                        if timestamp >= period:
+                                timestamp -= period
 
-            
+                        yield values[bisect.bisect_right(timestamps, timestamp) - 1]
+
+        @staticmethod
+        def _iter_value_chunks(timestamps, values, period, timestamp, step, chunk_size):
+                ramp = np.arange(1, chunk_size + 1, dtype=np.int64) * step
+                offsets = np.empty(chunk_size, dtype=np.int64)
+                chunk = np.empty(chunk_size, dtype=np.float64)
+
+                timestamp %= period
+                chunk_step = (chunk_size * step) % period
+
+                while True:
+                        np.add(ramp, timestamp, out=offsets)
+                        np.remainder(offsets, period, out=offsets)
+                        indexes = np.searchsorted(timestamps, offsets, side="right")
+                        indexes -= 1
+                        np.take(values, indexes, out=chunk)
+
+                        yield chunk
+
+                        timestamp = (timestamp + chunk_step) % period
+
+        @staticmethod
+        def _iter_samples(trace):
+                timestamps, values = trace.rotated()
+                timestamps = timestamps.tolist()
+                values = values.tolist()
+
+                loop_start = 0
+                while True:
+                        for timestamp, value in zip(timestamps, values):
+                                yield (loop_start + timestamp) / 1000000, value
+
+                        loop_start += trace.period
+
+        @staticmethod
+        def _iter_sample_chunks(trace, chunk_size):
+                timestamps, values = trace.rotated()
+
+                ramp = np.arange(chunk_size, dtype=np.int64)
+                positions = np.empty(chunk_size, dtype=np.int64)
+                indexes = np.empty(chunk_size, dtype=np.int64)
+                chunk_timestamps = np.empty(chunk_size, dtype=np.int64)
+                chunk_times = np.empty(chunk_size, dtype=np.float64)
+                chunk_values = np.empty(chunk_size, dtype=np.float64)
+
+                position = 0
+                while True:
+                        # i-th sample of the chunk: element (position + i) % n of the trace,
+                        # in loop (position + i) // n
+                        np.add(ramp, position, out=positions)
+                        np.remainder(positions, len(values), out=indexes)
+                        np.floor_divide(positions, len(values), out=positions)
+                        np.multiply(positions, trace.period, out=positions)
+                        np.take(timestamps, indexes, out=chunk_timestamps)
+                        np.add(chunk_timestamps, positions, out=chunk_timestamps)
+                        np.divide(chunk_timestamps, 1000000, out=chunk_times)
+                        np.take(values, indexes, out=chunk_values)
+
+                        yield chunk_times, chunk_values
+
+                        position += chunk_size
 
         def get_networkvalues(self, sec):
+                """Push forward both the RTT and the bandwidth traces by sec seconds, and return
+                what get_rtt(sec) and get_bandwidth(sec) would return"""
+
                 self._throw_if_invalid()
 
-                rtt = self.get_rtt(sec)
-                bandwidth = self.get_bandwidth(sec)
+                rtt_trace = self._get_rtt_trace()
+                bandwidth_trace = self._get_bandwidth_trace()
 
-                return rtt, bandwidth
+                # both cursors are moved by the same clock step
+                step = _seconds_to_microseconds(sec)
+                self._rtt_timestamp += step
+                self._bandwidth_timestamp += step
+                self._rtt_index = rtt_trace.locate(self._rtt_timestamp)
+                self._bandwidth_index = bandwidth_trace.locate(self._bandwidth_timestamp)
+
+                return NetworkTraceManager._sample(rtt_trace, self._rtt_index, self._rtt_timestamp), \
+                       NetworkTraceManager._sample(bandwidth_trace, self._bandwidth_index, self._bandwidth_timestamp)
+
+        def sample_networkvalues(self, times, incremental = False):
+                """Return the RTT and the bandwidth values at many instants at once, as two
+                pairs of aligned arrays (values, original timestamps), see sample_rtt()
+
+                If incremental is True, times are the arguments of successive
+                get_networkvalues() calls, and both traces are pushed forward accordingly."""
+
+                self._throw_if_invalid()
+
+                rtt_trace = self._get_rtt_trace()
+                bandwidth_trace = self._get_bandwidth_trace()
+
+                offsets = _seconds_to_microseconds_array(times)
+                if incremental:
+                        clock = np.cumsum(offsets)
+                        rtt_offsets = self._rtt_timestamp + clock
+                        bandwidth_offsets = self._bandwidth_timestamp + clock
+
+                        if len(clock) > 0:
+                                self._rtt_timestamp = int(rtt_offsets[-1])
+                                self._bandwidth_timestamp = int(bandwidth_offsets[-1])
+                                self._rtt_index = rtt_trace.locate(self._rtt_timestamp)
+                                self._bandwidth_index = bandwidth_trace.locate(self._bandwidth_timestamp)
+                else:
+                        rtt_offsets = bandwidth_offsets = offsets
+
+                return NetworkTraceManager._sample_many(rtt_trace, rtt_offsets), \
+                       NetworkTraceManager._sample_many(bandwidth_trace, bandwidth_offsets)
 
         def _check__instanceconfiguration(self):
-                if self._instanceconfiguration.getint("traceseed") == None:
+                if self._config.traceseed == None:
                         logging.error("Error: traceseed is missing")
                         self._status = self.__WRONG_CONFIGURATION
                         return
 
-                if self._instanceconfiguration.get("typeofmeasure") == None:
+                if self._config.typeofmeasure == None:
                         logging.error("Error: typeofmeasure is missing")
                         self._status = self.__WRONG_CONFIGURATION
                         return
                 
-                if self._instanceconfiguration.get("typeofmeasure") == "active":
-                        if self._instanceconfiguration.get("protocol") == None or \
-                           self._instanceconfiguration.get("observerPos") == None or \
-                           self._instanceconfiguration.get("cross-traffic") == None or \
-                           self._instanceconfiguration.get("access-technology") == None or \
-                           self._instanceconfiguration.get("sender-identity") == None or \
-                           self._instanceconfiguration.get("receiver-identity") == None:
+                if self._config.typeofmeasure == "active":
+                        if self._config.protocol == None or \
+                           self._config.observerPos == None or \
+                           self._config.cross_traffic == None or \
+                           self._config.access_technology == None or \
+                           self._config.sender_identity == None or \
+                           self._config.receiver_identity == None:
                                 logging.error("Error: Wrong configuration")
                                 self._status = self.__WRONG_CONFIGURATION
                                 return
@@ -334,221 +1636,144 @@ class NetworkTraceManager:
                 
                 logging.info("\n")
                 logging.info("NetworkTraceManager instance configuration: ")
-                for key in self._instanceconfiguration:
-                        logging.info ("\t" + key + " = " + self._instanceconfiguration.get(key))
-
-        def _compact_trace(self, tracelist):
-                max_tracegap = self._instanceconfiguration.getint("max_tracegap_seconds")
-                logging.info("\tmax_tracegap=" + str(max_tracegap))
-
-                previous_time = tracelist[0]["timestamp"]                
-                for i in range(0, len(tracelist)):
-                        diff_seconds = (tracelist[i]["timestamp"] - previous_time).total_seconds()
-                        
-                        if diff_seconds > max_tracegap:
-                                diff_seconds -= max_tracegap                                
-
-                                for j in range(i, len(tracelist)):
-                                        tracelist[j]["timestamp"] = tracelist[j]["timestamp"] \
-                                                                    - datetime.timedelta(seconds=diff_seconds)
-                        
-                        logging.info(str(tracelist[i]["timestamp"]) + "-" + str(previous_time) + " = " + 
-                                     str((tracelist[i]["timestamp"] - previous_time).total_seconds()))
-                        
-                        previous_time = tracelist[i]["timestamp"]
-                        
-
+                for field in dataclasses.fields(self._config):
+                        logging.info ("\t" + field.name + " = " + str(getattr(self._config, field.name)))
 
         def _get_traces(self):
                 self._throw_if_invalid()
 
-                rtt_tracefile = self._select_trace_file("RTT")
-                bandwidth_tracefile = self._select_trace_file("Bandwidth")
-                logging.info(f'RTT tracefile:       {rtt_tracefile}')
-                logging.info(f'Bandwidth tracefile: {bandwidth_tracefile}')
+                # select the trace files (cheap, and it validates the configuration), while
+                # reading the traces is left to _get_rtt_trace() and _get_bandwidth_trace():
+                # the starting item is drawn from a generator of this instance only, hence
+                # reading the trace later does not change the draw
+                self._rtt_tracefile = self._select_trace_file("RTT")
+                self._bandwidth_tracefile = self._select_trace_file("Bandwidth")
+                logging.info(f'RTT tracefile:       {self._rtt_tracefile}')
+                logging.info(f'Bandwidth tracefile: {self._bandwidth_tracefile}')
 
-                if rtt_tracefile == None :#or bandwidth_tracefile == None:
+                if self._rtt_tracefile == None :#or bandwidth_tracefile == None:
                         self._status = self.__WRONG_INPUTFILEPATH
                         return
 
-                starting_time = self._swallow_trace(
-                        rtt_tracefile,
-                        self._rtt_trace,
-                        'rtt',
-                        None)
-                assert starting_time is not None
-                #NetworkTraceManager._swallow_trace(
-                #        bandwidth_tracefile,
-                #        self._bandwidth_trace,
-                #        'bandwidth',
-                #        starting_time)
+        def _get_cursor(self, trace_type):
+                """Return the RTT (or bandwidth) trace and the current relative timestamp"""
+
+                if trace_type == 'rtt':
+                        return self._get_rtt_trace(), self._rtt_timestamp
+
+                return self._get_bandwidth_trace(), self._bandwidth_timestamp
 
-                self._compact_trace(self._rtt_trace)
-                #self._compact_trace(self._bandwidth_trace)
+        def _get_rtt_trace(self, base = None):
+                """Return the RTT trace, reading it on first use (unless its base trace is
+                given)"""
+
+                if self._rtt_trace is None:
+                        self._rtt_trace = self._swallow_trace(
+                                self._rtt_tracefile,
+                                None,
+                                base)
+                        logging.info("rtt: " + str(self._rtt_trace))
+
+                return self._rtt_trace
+
+        def _get_bandwidth_trace(self):
+                """Return the bandwidth trace, reading it on first use
+
+                The bandwidth trace file is selected at construction, but it is read only
+                when needed, so that RTT-only users do not pay for it. The bandwidth trace
+                starts at the sample in effect at the starting time of the RTT trace."""
+
+                if self._bandwidth_trace is None:
+                        if self._bandwidth_tracefile == None:
+                                logging.error("Error: no bandwidth trace matches the configuration")
+                                raise InvalidConfiguration
+
+                        self._bandwidth_trace = self._swallow_trace(
+                                self._bandwidth_tracefile,
+                                _to_datetime(self._get_rtt_trace().start))
+                        logging.info("bandwidth: " + str(self._bandwidth_trace))
+
+                return self._bandwidth_trace
 
 
         def _getrandomintegers(self, randomgenerator, fromvalue, tovalue):
                 assert randomgenerator in ["trace", "starting_item"]
 
+                if self._sharedrandomgenerators:
+                        self._tracerandomgenerator = copy.copy(self._tracerandomgenerator)
+                        self._startingitemrandomgenerator = copy.copy(self._startingitemrandomgenerator)
+                        self._sharedrandomgenerators = False
+
                 if randomgenerator == "trace":
-                        random.setstate(self._tracerandomgenerator)
-                        randomvalue = random.randint(fromvalue, tovalue)
-                        self._tracerandomgenerator = random.getstate()
-                        return randomvalue
-        
+                        return self._tracerandomgenerator.randint(fromvalue, tovalue)
+
                 if randomgenerator == "starting_item":
-                        random.setstate(self._startingitemrandomgenerator)
-                        randomvalue = random.randint(fromvalue, tovalue)
-                        self._startingitemrandomgenerator = random.getstate()
-                        return randomvalue
+                        return self._startingitemrandomgenerator.randint(fromvalue, tovalue)
 
         #@staticmethod
-        def _swallow_trace(self, trace_filename, trace_out, trace_type, starting_time):
-                assert trace_type in ['rtt', 'bandwidth']
-                assert len(trace_out) == 0
+        def _swallow_trace(self, trace_filename, starting_time, base = None):
+                """Return the trace of a trace file rotated at a random starting element, or at
+                the element preceding starting_time"""
+
+                if base is None:
+                        base = _BaseTrace.load(self._trace_cache, trace_filename)
+                timestamps = base.timestamps
+
+                assert len(timestamps) >= 2
+
+                # select random starting point, unless the client
+                # specified a given starting point to use as argument
+                #
+                # never select the first element as the starting element
+                # (not to concern with that corner case)
+                if starting_time:
+                        # select the starting_item as the element before
+                        # the one exceeding the given time (if this happens
+                        # at the very first element, then the starting_item
+                        # is 0), or if no elements exceed the given
+                        # time then we set starting_time to the last
+                        # element (timestamps are sorted, hence a binary
+                        # search finds the first element exceeding the time)
+                        i = int(np.searchsorted(timestamps, _to_microseconds(starting_time), side="right"))
+                        starting_item = i - 1 if i > 0 else 0
+                else:
+                        starting_item =  self._getrandomintegers("starting_item", 1, len(timestamps) - 1)
+
+                # remove the gaps exceeding max_tracegap_seconds; since the looped
+                # elements are placed right after the last element, compacting the trace
+                # before or after looping it is the same
+                max_tracegap = self._config.max_tracegap_seconds
+                logging.info("\tmax_tracegap=" + str(max_tracegap))
 
-                with open (trace_filename, "r") as input_tracefile:
-                        # read whole file (1 file == 1 line)
-                        data_list = input_tracefile.readline().split(",")
-
-                        assert len(data_list) >= 2
-
-                        # select random starting point, unless the client
-                        # specified a given starting point to use as argument
-                        #
-                        # never select the first element as the starting element
-                        # (not to concern with that corner case)
-                        if starting_time:
-                                # select the starting_item as the element before
-                                # the one exceeding the given time (if this happens
-                                # at the very first element, then the starting_item
-                                # is 0), or if no elements exceed the given
-                                # time then we set starting_time to the last
-                                # element
-                                starting_item = len(data_list) - 1
-                                for i in range(len(data_list)):
-                                        trace_timestamp = datetime.datetime.strptime(
-                                                data_list[i].split("_")[0].strip(),
-                                                datetime_format)
-                                        if trace_timestamp > starting_time:
-                                                starting_item = i - 1 if i > 0 else 0
-                                                break
-                        else:
-                                starting_item =  self._getrandomintegers("starting_item", 1, len(data_list) - 1)
-
-                        # insert all elements from the starting one onward
-                        #
-                        # the timestamp is kept the same as the
-                        # actual timestamp read from file
-                        for i in range(starting_item, len(data_list)):
-                                trace_timestamp = datetime.datetime.strptime(
-                                        data_list[i].split("_")[0].strip(),
-                                        datetime_format)
-                                trace_data = data_list[i].split("_")[1].strip()
-
-                                trace_out.append({
-                                        "timestamp": trace_timestamp,
-                                        trace_type: trace_data,
-                                        "absolute_timestamp": trace_timestamp})
-
-                        last_timestamp = datetime.datetime.strptime(
-                                        data_list[len(data_list) - 1].split("_")[0].strip(),
-                                        datetime_format)
-
-                        # insert all elements preceding the starting one
-                        # 
-                        # the timestamp is modified so as to pretend
-                        # that the values before the starting element have been
-                        # obtained _after_ that (looping)
-                        #
-                        # however, the absolute timestamp is kept equal to
-                        # the actual timestamp from the trace file
-                        first_looped_timestamp = datetime.datetime.strptime(
-                                        data_list[0].split("_")[0].strip(),
-                                        datetime_format)
-                        for i in range(0, starting_item):
-                                trace_timestamp = datetime.datetime.strptime(
-                                        data_list[i].split("_")[0].strip(),
-                                        datetime_format)
-                                trace_data = data_list[i].split("_")[1].strip()
-                                adjusted_timestamp = \
-                                        last_timestamp + \
-                                        (trace_timestamp - first_looped_timestamp)
-
-                                trace_out.append({
-                                        "timestamp": adjusted_timestamp,
-                                        trace_type: trace_data,
-                                        "absolute_timestamp": trace_timestamp})
-
-                        return datetime.datetime.strptime(
-                                        data_list[starting_item].split("_")[0].strip(),
-                                        datetime_format)
-                return None
+                return _Trace(base, starting_item, max_tracegap * 1000000)
 
         def _select_trace_file(self, m):
-                typeofmeasure = self._instanceconfiguration.get("typeofmeasure").strip()
-                command = self._instanceconfiguration.get("protocol").strip() + m.strip()
-                observerPos = self._instanceconfiguration.get("observerPos").strip()
-                cross_traffic = self._instanceconfiguration.get("cross-traffic").strip()
-                access_technology = self._instanceconfiguration.get("access-technology").strip()
-                sender_identity = self._instanceconfiguration.get("sender-identity").strip()
-                receiver_identity = self._instanceconfiguration.get("receiver-identity").strip()
+                typeofmeasure = self._config.typeofmeasure.strip()
+                command = self._config.protocol.strip() + m.strip()
+                observerPos = self._config.observerPos.strip()
+                cross_traffic = self._config.cross_traffic.strip()
+                access_technology = self._config.access_technology.strip()
+                sender_identity = self._config.sender_identity.strip()
+                receiver_identity = self._config.receiver_identity.strip()
 
                 logging.info("searching for " + typeofmeasure + " " + command + ", " + observerPos + ", " + \
                          cross_traffic + ", " + access_technology + ", " + sender_identity + ", " + \
                          receiver_identity)
 
-                with open (self._instanceconfiguration.get("mapping_file"), "r") as inputjson:
-                        data = json.load(inputjson)
-
-                for elem in data:
-                        path = None
-                        for key in elem :
-                                if key == "typeofmeasure" and typeofmeasure != elem[key]:
-                                        path = None
-                                        break
-                                if key == "command" and command != elem[key]:
-                                        path = None
-                                        break 
-                                if key == "ObserverPos" and observerPos != elem[key]:
-                                        path = None
-                                        break
-                                if key == "noise" and cross_traffic != elem[key]:
-                                        path = None
-                                        break
-                                if key == "senderIdentity" and sender_identity != elem[key]:
-                                        path = None
-                                        break
-                                if key == "receiverIdentity" and receiver_identity != elem[key]:
-                                        path = None
-                                        break
-                                if key == "access-technology" and access_technology != elem[key]:
-                                        path = None
-                                        break
-                                if key == "path":
-                                        path = elem[key]                                                            
-                                if key == "direction" and elem[key] == "downstream":
-                                        if (sender_identity == "Client" and receiver_identity == "Observer")  or\
-                                           (sender_identity == "Observer" and receiver_identity == "Server"):
-                                                path = None
-                                                break    
-                                if key == "direction" and elem[key] == "upstream":
-                                        if (sender_identity == "Observer" and receiver_identity == "Client")  or\
-                                           (sender_identity == "Server" and receiver_identity == "Observer"):
-                                                path = None
-                                                break 
-                                if key == "first-endpoint":
-                                        if  elem[key]!=sender_identity and elem[key]!=receiver_identity:
-                                                path = None
-                                                break
-                                       
-     
-                        if path != None:
-                                logging.info("Select a random trace")
-                                random_index=self._getrandomintegers("trace", 0, len(path)-1)
-                                filepath = path[random_index]
-                                logging.info("trace_file:\t" + filepath + " with index " + str(random_index))
-                                return filepath
+                catalog = self._catalog
+                if catalog == None:
+                        catalog = MappingCatalog.load(self._config.mapping_file)
+
+                path = catalog.select(
+                        typeofmeasure, command, observerPos, cross_traffic, access_technology,
+                        sender_identity, receiver_identity)
+
+                if path != None:
+                        logging.info("Select a random trace")
+                        random_index=self._getrandomintegers("trace", 0, len(path)-1)
+                        filepath = path[random_index]
+                        logging.info("trace_file:\t" + filepath + " with index " + str(random_index))
+                        return filepath
                 return None
 
 
@@ -1,17 +1,40 @@
 #!/usr/bin/env python3
 
+import asyncio
+import dataclasses
+import io
+import itertools
+import json
 import logging
 import os
+import random
 import unittest
+import tarfile
 import tempfile
 import configparser
+from concurrent.futures import ThreadPoolExecutor
 
-from network_trace_manager import NetworkTraceManager, InvalidConfiguration
+import numpy as np
+
+import warm_cache
+from trace_player import TracePlayer
+from network_trace_manager import NetworkTraceManager, InvalidConfiguration, MappingCatalog, TraceCache, \
+    TraceArchive, TraceMetadata, TraceConfig, _BaseTrace
 
 logging.basicConfig(level=logging.FATAL)
 
 class TestNetworkTraceManager(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # the binary trace cache is kept out of the input files
+        cls._cache_dir = tempfile.TemporaryDirectory()
+        cls.trace_cache_dir = cls._cache_dir.name
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._cache_dir.cleanup()
+
     @staticmethod
     def write_to_conf_file(conf_file):
         conf_file.write(
@@ -19,6 +42,7 @@ b'''
 [DEFAULT]
 max_tracegap_seconds=30
 mapping_file=inputFiles/mapping.json
+trace_cache_dir=%s
 
 [confGood]
 seed=0
@@ -41,9 +65,33 @@ access-technology = wifi
 sender-identity=Observer
 receiver-identity=Client
 trace = True
-''')
+
+[confSeeded]
+traceseed=5
+startingitemseed=6
+typeofmeasure=active
+protocol=TCP
+observerPos=edge
+cross-traffic = 0M
+access-technology = wifi
+sender-identity=Observer
+receiver-identity=Client
+''' % TestNetworkTraceManager.trace_cache_dir.encode())
         conf_file.flush()
 
+    @staticmethod
+    def write_to_mapping_file(mapping_file):
+        mapping_file.write(
+b'''[
+    {"typeofmeasure": "active", "command": "TCPRTT", "direction": null, "access-technology": "wifi",
+     "ObserverPos": "edge", "noise": "0M", "first-endpoint": "Client", "second-endpoint": "Observer",
+     "path": ["inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace0.txt"]},
+    {"typeofmeasure": "active", "command": "TCPBandwidth", "direction": "downstream", "access-technology": "wifi",
+     "ObserverPos": "edge", "noise": "0M", "senderIdentity": "Observer", "receiverIdentity": "Client",
+     "path": ["inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace0.txt"]}
+]''')
+        mapping_file.flush()
+
     def test_valid_invalid_configuration(self):
         config = None
         with tempfile.NamedTemporaryFile() as conf_file:
@@ -99,6 +147,631 @@ b'''[
             self.assertEqual('Client', trace_list[0]['senderIdentity'])
             self.assertEqual('Observer', trace_list[0]['receiverIdentity'])
 
+    def test_get_trace_list_filter(self):
+        trace_list = NetworkTraceManager.get_tracelist('inputFiles/mapping.json', noise={'0M', '10M'},
+                                                       access_technology='wifi', direction='upstream')
+        self.assertGreater(len(trace_list), 0)
+        self.assertEqual({'0M', '10M'}, {record['noise'] for record in trace_list})
+        self.assertEqual({'wifi'}, {record['access-technology'] for record in trace_list})
+        self.assertEqual(
+            len(trace_list),
+            len(NetworkTraceManager.get_tracelist('inputFiles/mapping.json', noise='0M', access_technology='wifi')) +
+            len(NetworkTraceManager.get_tracelist('inputFiles/mapping.json', noise='10M', access_technology='wifi')))
+
+        # the records are read-only and shared by the identical queries
+        with self.assertRaises(TypeError):
+            trace_list[0]['noise'] = '20M'
+        same_list = NetworkTraceManager.get_tracelist('inputFiles/mapping.json', noise=['10M', '0M'],
+                                                      access_technology={'wifi'}, direction='upstream')
+        self.assertEqual(trace_list, same_list)
+        self.assertIs(trace_list[0], same_list[0])
+        self.assertEqual([], NetworkTraceManager.get_tracelist('inputFiles/mapping.json', noise=set()))
+
+    def test_mapping_catalog(self):
+        catalog = MappingCatalog.load('inputFiles/mapping.json')
+        self.assertIs(catalog, MappingCatalog.load('inputFiles/mapping.json'))
+
+        path = catalog.select('active', 'TCPRTT', 'edge', '0M', 'wifi', 'Observer', 'Client')
+        self.assertEqual(200, len(path))
+        self.assertIn('wifi-TCPRTT-noise0M_Client_edge', path[0])
+        self.assertIsNone(catalog.select('active', 'TCPBandwidth', 'edge', '0M', 'wifi', 'Observer', 'Client'))
+
+        with tempfile.NamedTemporaryFile() as mapping_file:
+            mapping_file.write(b'[{"typeofmeasure": "active", "command": "TCPRTT", "path": ["a.txt"]}]')
+            mapping_file.flush()
+            catalog = MappingCatalog.load(mapping_file.name)
+            self.assertEqual(['a.txt'], catalog.select('active', 'TCPRTT', 'edge', '0M', 'wifi', 'Observer', 'Client'))
+
+            # the catalog is parsed again when the file changes
+            mapping_file.seek(0)
+            mapping_file.write(b'[{"typeofmeasure": "active", "command": "TCPRTT", "path": ["b.txt"]}]')
+            mapping_file.flush()
+            stat = os.stat(mapping_file.name)
+            os.utime(mapping_file.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+            self.assertIsNot(catalog, MappingCatalog.load(mapping_file.name))
+            self.assertEqual(['b.txt'], MappingCatalog.load(mapping_file.name).select(
+                'active', 'TCPRTT', 'edge', '0M', 'wifi', 'Observer', 'Client'))
+
+    def test_trace_cache(self):
+        trace_file = 'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace0.txt'
+        timestamps, values = TraceCache.parse(trace_file)
+        self.assertEqual(len(timestamps), len(values))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = TraceCache(cache_dir)
+            cache_file = cache.cache_filename(trace_file)
+            self.assertFalse(os.path.exists(cache_file))
+
+            cache.load(trace_file)
+            self.assertTrue(os.path.exists(cache_file))
+            # the cache file has the permissions of any new file, not those of a temporary file
+            with open(os.path.join(cache_dir, 'new_file'), 'w'):
+                pass
+            self.assertEqual(os.stat(os.path.join(cache_dir, 'new_file')).st_mode, os.stat(cache_file).st_mode)
+            warm = cache.load(trace_file)
+            self.assertEqual(list(timestamps), list(warm[0]))
+            self.assertEqual(list(values), list(warm[1]))
+            self.assertFalse(warm[1].flags.writeable)
+
+            # a cache file not matching the trace file is rebuilt
+            stat = os.stat(trace_file)
+            os.utime(cache_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            with open(cache_file, 'r+b') as cache_output:
+                cache_output.seek(12)
+                cache_output.write(b'\0' * 8)
+            self.assertIsNone(cache._read(cache_file, stat.st_mtime_ns, stat.st_size))
+            self.assertEqual(list(values), list(cache.load(trace_file)[1]))
+            self.assertIsNotNone(cache._read(cache_file, stat.st_mtime_ns, stat.st_size))
+
+    def test_warm_cache(self):
+        trace_file = 'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace0.txt'
+        other_file = 'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace1.txt'
+        missing_file = 'inputFiles/active/missing_trace.txt'
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            mapping_file = os.path.join(cache_dir, 'mapping.json')
+            with open(mapping_file, 'w') as mapping_output:
+                json.dump([{"path": [trace_file, missing_file]}, {"path": [trace_file]},
+                           {"path": other_file}, {"typeofmeasure": "TCPRTT"}], mapping_output)
+
+            # a string path is a single trace file, and entries without a path are skipped
+            self.assertEqual(warm_cache.trace_filenames(mapping_file), [trace_file, missing_file, other_file])
+
+            metadata, failures, processed_bytes = warm_cache.warm(mapping_file, cache_dir, workers=1)
+            self.assertEqual(sorted(metadata), [trace_file, other_file])
+            self.assertEqual(list(failures), [missing_file])
+            self.assertEqual(processed_bytes, os.stat(trace_file).st_size + os.stat(other_file).st_size)
+
+            timestamps, values = TraceCache.parse(trace_file)
+            self.assertEqual(metadata[trace_file]['samples'], len(values))
+            self.assertEqual(metadata[trace_file]['max'], values.max())
+            self.assertEqual(TraceMetadata.load(mapping_file).traces, metadata)
+
+            cache = TraceCache(cache_dir)
+            stat = os.stat(trace_file)
+            self.assertIsNotNone(cache._read(cache.cache_filename(trace_file), stat.st_mtime_ns, stat.st_size))
+
+        # traces read from an archive by several workers, each opening the archive on its own
+        with tempfile.TemporaryDirectory() as archive_dir, tempfile.TemporaryDirectory() as cache_dir:
+            archive_file = os.path.join(archive_dir, 'traces.tar.xz')
+            archived_files = []
+            with tarfile.open(archive_file, 'w:xz') as archive:
+                for i in range(200):
+                    archive.add(f'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace{i}.txt',
+                                arcname=f'active/trace{i}.txt')
+                    archived_files.append(os.path.join(archive_dir, f'active/trace{i}.txt'))
+
+            mapping_file = os.path.join(archive_dir, 'mapping.json')
+            with open(mapping_file, 'w') as mapping_output:
+                json.dump([{"path": archived_files}], mapping_output)
+
+            metadata, failures, _ = warm_cache.warm(mapping_file, cache_dir, archive_file, workers=2, chunksize=4)
+            self.assertEqual({}, failures)
+            self.assertEqual(sorted(archived_files), sorted(metadata))
+            self.assertEqual(metadata[archived_files[1]]['samples'],
+                             len(TraceCache.parse('inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace1.txt')[1]))
+
+    def test_parse_line(self):
+        timestamps, values = TraceCache.parse_line(
+            '2020-04-06 19:10:54.987_34.0,2020-04-06 19:11:12.987_35.5\n')
+        self.assertEqual([1586200254987000, 1586200272987000], list(timestamps))
+        self.assertEqual([34.0, 35.5], list(values))
+
+        # non-padded timestamps are parsed as well
+        timestamps, values = TraceCache.parse_line('2020-04-06 19:13:3.9873_31.0,2020-04-06 19:14:43.98_84.0')
+        self.assertEqual([1586200383987300, 1586200483980000], list(timestamps))
+        self.assertEqual([31.0, 84.0], list(values))
+
+    def test_parse_stream(self):
+        trace_file = 'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace0.txt'
+        with open(trace_file) as trace_input:
+            timestamps, values = TraceCache.parse_line(trace_input.readline())
+
+        for chunk_size in [1, 7, 64, 1 << 20]:
+            with open(trace_file) as trace_input:
+                chunked_timestamps, chunked_values = TraceCache.parse_stream(trace_input, chunk_size)
+            self.assertEqual(list(timestamps), list(chunked_timestamps))
+            self.assertEqual(list(values), list(chunked_values))
+
+        # only the first line is parsed
+        timestamps, values = TraceCache.parse_stream(io.StringIO(
+            '2020-04-06 19:13:3.9873_31.0,2020-04-06 19:14:43.98_84.0,\n2020-04-06 19:15:00.0_1.0'), 5)
+        self.assertEqual([1586200383987300, 1586200483980000], list(timestamps))
+        self.assertEqual([31.0, 84.0], list(values))
+        self.assertEqual(0, len(TraceCache.parse_stream(io.StringIO(''))[1]))
+
+    def test_trace_archive(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            archive_file = os.path.join(archive_dir, 'traces.tar.xz')
+            with tarfile.open(archive_file, 'w:xz') as archive:
+                for i in range(3):
+                    trace_file = f'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace{i}.txt'
+                    archive.add(trace_file, arcname=f'active/trace{i}.txt')
+
+            archive = TraceArchive.load(archive_file)
+            self.assertIs(archive, TraceArchive.load(archive_file))
+            self.assertIn(os.path.join(archive_dir, 'active/trace0.txt'), archive)
+            self.assertNotIn(os.path.join(archive_dir, 'trace0.txt'), archive)
+            self.assertRaises(FileNotFoundError, lambda: archive.read(os.path.join(archive_dir, 'trace0.txt')))
+
+            with open('inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace1.txt', 'rb') as trace_file:
+                self.assertEqual(trace_file.read(), archive.read(os.path.join(archive_dir, 'active/trace1.txt')))
+
+            # the decompressed members are bounded by size
+            archive.max_cache_bytes = 1
+            for i in range(3):
+                archive.read(os.path.join(archive_dir, f'active/trace{i}.txt'))
+            self.assertEqual(1, len(archive._cache))
+
+    def test_trace_from_archive(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        config['confSeeded']['trace_archive'] = 'inputFiles/active.tar.xz'
+        config['confSeeded']['trace_cache'] = 'False'
+        archived_trace = NetworkTraceManager(config['confSeeded'])
+        self.assertEqual(trace.get_rtt_timeseries(), archived_trace.get_rtt_timeseries())
+
+    def test_compaction(self):
+        timestamps = TraceCache.parse_line(
+            '2020-04-06 19:10:54.000_1,2020-04-06 19:10:55.000_2,2020-04-06 19:11:55.000_3,'
+            '2020-04-06 19:11:56.000_4,2020-04-06 20:11:56.000_5')[0]
+        offsets = _BaseTrace.compaction_offsets(timestamps, 30 * 1000000)
+        self.assertEqual([0, 0, 30, 30, 3600], [x // 1000000 for x in offsets])
+        self.assertEqual([0, 1, 31, 32, 62], [(x - timestamps[0]) // 1000000 for x in timestamps - offsets])
+
+    def test_trace_pool(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        config['confSeeded']['startingitemseed'] = '7'
+        other_trace = NetworkTraceManager(config['confSeeded'])
+
+        # same trace file, different rotations
+        self.assertIs(trace._rtt_trace.base, other_trace._rtt_trace.base)
+        self.assertNotEqual(trace._rtt_trace.starting_item, other_trace._rtt_trace.starting_item)
+        self.assertNotEqual(trace.get_rtt_timeseries(), other_trace.get_rtt_timeseries())
+
+        # compacted timestamps are computed once per max_tracegap
+        base = trace._rtt_trace.base
+        compacted = base.compacted(1000)
+        self.assertIs(compacted, base.compacted(1000))
+        self.assertLessEqual(max(compacted[1:] - compacted[:-1]), 1000)
+
+        # once the pool is emptied, the trace file is read again
+        _BaseTrace.clear()
+        self.assertIsNot(base, NetworkTraceManager(config['confSeeded'])._rtt_trace.base)
+        self.assertEqual(other_trace.get_rtt_timeseries(), NetworkTraceManager(config['confSeeded']).get_rtt_timeseries())
+
+    def test_timeseries_arrays(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        timestamps, values = trace.get_rtt_timeseries()
+        array_timestamps, array_values = trace.get_rtt_timeseries(as_arrays=True)
+        self.assertEqual(timestamps, list(array_timestamps))
+        self.assertEqual(values, list(array_values))
+        self.assertFalse(array_values.flags.writeable)
+        self.assertFalse(array_timestamps.flags.writeable)
+
+        # the arrays are built once and shared with the instances using the same rotation
+        same_timestamps, same_values = NetworkTraceManager(config['confSeeded']).get_rtt_timeseries(as_arrays=True)
+        self.assertIs(array_timestamps, same_timestamps)
+        self.assertIs(array_values, same_values)
+
+        rtt, timestamp, absolute_timestamp = trace.get_rtt(0)
+        self.assertEqual(values[0], rtt)
+        self.assertEqual(timestamp, absolute_timestamp)
+
+        position_timestamps, position_values, period, timestamp = trace.get_position()
+        self.assertEqual(list(array_timestamps), [t / 1000000 for t in position_timestamps])
+        self.assertIs(array_values, position_values)
+        self.assertEqual(0, timestamp)
+        self.assertGreater(period, position_timestamps[-1])
+        trace.get_rtt(period / 1000000 + 1.5)
+        self.assertEqual(period + 1500000, trace.get_position()[3])
+        self.assertEqual(0, NetworkTraceManager(config['confSeeded']).get_position()[3])
+
+    def test_get_rtt_jump(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        stepped_trace = NetworkTraceManager(config['confSeeded'])
+        timestamps, values = trace.get_rtt_timeseries()
+        period = timestamps[-1] + 30
+
+        # jumping one million periods ahead lands on the same sample
+        rtt, timestamp, absolute_timestamp = trace.get_rtt(1000000 * period + timestamps[2])
+        self.assertEqual(values[2], rtt)
+        self.assertEqual(stepped_trace.get_rtt(timestamps[2])[2], absolute_timestamp)
+
+        # the cursor stays on the last sample until the gap after it has elapsed
+        self.assertEqual(values[-1], trace.get_rtt(timestamps[-1] - timestamps[2] + 29.9)[0])
+        self.assertEqual(values[0], trace.get_rtt(0.1)[0])
+
+    def test_sample_rtt(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        stepped_trace = NetworkTraceManager(config['confSeeded'])
+
+        rng = random.Random(0)
+        steps = [rng.choice([0, 0.001, 0.002, 0.01, 0.5, 31]) for _ in range(1000)]
+        values, absolute_timestamps = trace.sample_rtt(steps, incremental=True)
+        self.assertEqual(len(steps), len(values))
+        for i, sec in enumerate(steps):
+            rtt, _, absolute_timestamp = stepped_trace.get_rtt(sec)
+            self.assertEqual(rtt, values[i])
+            self.assertEqual(absolute_timestamp, absolute_timestamps[i].item())
+
+        # the cursor has been pushed forward
+        self.assertEqual(stepped_trace.get_rtt(0.001), trace.get_rtt(0.001))
+
+        # offsets from the starting element (of the samples sharing the same
+        # timestamp, only the last one is ever in effect)
+        timestamps, timeseries_values = trace.get_rtt_timeseries()
+        values, _ = trace.sample_rtt(timestamps)
+        for i in range(len(timestamps) - 1):
+            if timestamps[i] != timestamps[i + 1]:
+                self.assertEqual(timeseries_values[i], values[i])
+
+    def test_concurrent_construction(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        configs = []
+        for seed in range(16):
+            config[f'conf{seed}'] = config['confSeeded']
+            config[f'conf{seed}']['traceseed'] = str(seed)
+            config[f'conf{seed}']['startingitemseed'] = str(seed * 2)
+            configs.append(config[f'conf{seed}'])
+
+        def build(conf):
+            return NetworkTraceManager(conf).get_rtt_timeseries()
+
+        random.seed(42)
+        state = random.getstate()
+        expected = [build(conf) for conf in configs]
+        self.assertEqual(state, random.getstate())
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.assertEqual(expected, list(executor.map(build, configs)))
+
+    def test_lazy_bandwidth(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        # RTT-only mapping file
+        trace = NetworkTraceManager(config['confSeeded'])
+        self.assertIsNone(trace._bandwidth_trace)
+        self.assertRaises(InvalidConfiguration, lambda: trace.get_bandwidth(1))
+
+        with tempfile.NamedTemporaryFile() as mapping_file:
+            TestNetworkTraceManager.write_to_mapping_file(mapping_file)
+            config['confSeeded']['mapping_file'] = mapping_file.name
+
+            trace = NetworkTraceManager(config['confSeeded'])
+            self.assertIsNone(trace._bandwidth_trace)
+
+            bandwidth, timestamp, absolute_timestamp = trace.get_bandwidth(0)
+            self.assertIsNotNone(trace._bandwidth_trace)
+
+            # the bandwidth trace is aligned to the starting time of the RTT trace
+            self.assertEqual(trace.get_rtt(0)[1], timestamp)
+            self.assertEqual(timestamp, absolute_timestamp)
+
+            self.assertEqual(trace.get_rtt_timeseries()[1][-1], trace.get_bandwidth_timeseries()[1][-1])
+
+    def test_networkvalues(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        with tempfile.NamedTemporaryFile() as mapping_file:
+            TestNetworkTraceManager.write_to_mapping_file(mapping_file)
+            config['confSeeded']['mapping_file'] = mapping_file.name
+
+            trace = NetworkTraceManager(config['confSeeded'])
+            batched_trace = NetworkTraceManager(config['confSeeded'])
+            stepped_trace = NetworkTraceManager(config['confSeeded'])
+
+            rng = random.Random(1)
+            steps = [rng.choice([0, 0.001, 0.003, 0.01, 0.2, 30]) for _ in range(200)]
+            (rtt_values, rtt_timestamps), (bandwidth_values, bandwidth_timestamps) = \
+                batched_trace.sample_networkvalues(steps, incremental=True)
+
+            for i, sec in enumerate(steps):
+                rtt, bandwidth = trace.get_networkvalues(sec)
+                self.assertEqual(stepped_trace.get_rtt(sec), rtt)
+                self.assertEqual(stepped_trace.get_bandwidth(sec), bandwidth)
+                self.assertEqual(rtt[0], rtt_values[i])
+                self.assertEqual(rtt[2], rtt_timestamps[i].item())
+                self.assertEqual(bandwidth[0], bandwidth_values[i])
+                self.assertEqual(bandwidth[2], bandwidth_timestamps[i].item())
+
+            self.assertEqual(trace.get_networkvalues(1), batched_trace.get_networkvalues(1))
+
+    def test_snapshot(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        with tempfile.NamedTemporaryFile() as mapping_file:
+            TestNetworkTraceManager.write_to_mapping_file(mapping_file)
+            config['confSeeded']['mapping_file'] = mapping_file.name
+
+            trace = NetworkTraceManager(config['confSeeded'])
+            for _ in range(7):
+                trace.get_networkvalues(0.3)
+            snapshot = json.loads(json.dumps(trace.snapshot()))
+            restored_trace = NetworkTraceManager.restore(snapshot)
+            self.assertIs(trace._rtt_trace.base, restored_trace._rtt_trace.base)
+            self.assertEqual([trace.get_networkvalues(0.7) for _ in range(50)],
+                             [restored_trace.get_networkvalues(0.7) for _ in range(50)])
+
+            # the traces not read yet are drawn as they would have been
+            config['confSeeded']['lazy'] = 'True'
+            lazy_trace = NetworkTraceManager(config['confSeeded'])
+            restored_trace = NetworkTraceManager.restore(json.loads(json.dumps(lazy_trace.snapshot())))
+            self.assertIsNone(restored_trace._rtt_trace)
+            self.assertEqual(lazy_trace.get_networkvalues(1.5), restored_trace.get_networkvalues(1.5))
+
+            # the trace files must not have changed in the meantime
+            snapshot['rtt']['source'][0] += 1
+            self.assertRaises(InvalidConfiguration, lambda : NetworkTraceManager.restore(snapshot))
+
+    def test_fork(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        with tempfile.NamedTemporaryFile() as mapping_file:
+            TestNetworkTraceManager.write_to_mapping_file(mapping_file)
+            config['confSeeded']['mapping_file'] = mapping_file.name
+
+            trace = NetworkTraceManager(config['confSeeded'])
+            for _ in range(7):
+                trace.get_networkvalues(0.3)
+
+            forks = [trace.fork() for _ in range(3)]
+            self.assertIs(trace._rtt_trace, forks[0]._rtt_trace)
+            forks[1].get_rtt(100)
+            expected = [trace.get_networkvalues(0.7) for _ in range(20)]
+            self.assertEqual(expected, [forks[0].get_networkvalues(0.7) for _ in range(20)])
+            fork_of_fork = forks[2].fork()
+            self.assertEqual(expected, [fork_of_fork.get_networkvalues(0.7) for _ in range(20)])
+            self.assertEqual(expected, [forks[2].get_networkvalues(0.7) for _ in range(20)])
+
+            # traces not read yet are drawn by each instance, as the original one would
+            config['confSeeded']['lazy'] = 'True'
+            lazy_trace = NetworkTraceManager(config['confSeeded'])
+            lazy_fork = lazy_trace.fork()
+            self.assertEqual(NetworkTraceManager(config['confSeeded']).get_rtt(1.5), lazy_fork.get_rtt(1.5))
+            self.assertEqual(lazy_fork._rtt_trace.starting_item, lazy_trace._get_rtt_trace().starting_item)
+            self.assertIsNot(lazy_fork._startingitemrandomgenerator, lazy_trace._startingitemrandomgenerator)
+
+    def test_lazy_construction(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        config['confSeeded']['lazy'] = 'True'
+        lazy_trace = NetworkTraceManager(config['confSeeded'])
+        self.assertIsNone(lazy_trace._rtt_trace)
+        self.assertEqual(trace.get_rtt(1.5), lazy_trace.get_rtt(1.5))
+        self.assertEqual(trace.get_rtt_timeseries(), lazy_trace.get_rtt_timeseries())
+
+        # the configuration is validated anyway
+        config['confBad']['lazy'] = 'True'
+        self.assertRaises(InvalidConfiguration, lambda : NetworkTraceManager(config["confBad"]))
+        config['confSeeded']['cross-traffic'] = '1M'
+        self.assertRaises(InvalidConfiguration, lambda : NetworkTraceManager(config["confSeeded"]))
+
+    def test_trace_config(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace_config = TraceConfig.from_config(config['confSeeded'])
+        self.assertEqual(TraceConfig(mapping_file='inputFiles/mapping.json', traceseed=5, startingitemseed=6,
+                                     max_tracegap_seconds=30, typeofmeasure='active', protocol='TCP',
+                                     observerPos='edge', cross_traffic='0M', access_technology='wifi',
+                                     sender_identity='Observer', receiver_identity='Client',
+                                     trace_cache_dir=self.trace_cache_dir), trace_config)
+        self.assertEqual(trace_config, TraceConfig.from_config(dict(config['confSeeded'])))
+        self.assertEqual({trace_config: 1}[TraceConfig.from_config(config['confSeeded'])], 1)
+        self.assertFalse(hasattr(trace_config, '__dict__'))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            trace_config.traceseed = 6
+        self.assertTrue(TraceConfig.from_config({'lazy': 'yes'}).lazy)
+        self.assertRaises(ValueError, lambda : TraceConfig.from_config({'lazy': 'maybe'}))
+
+        self.assertEqual(NetworkTraceManager(config['confSeeded']).get_rtt_timeseries(),
+                         NetworkTraceManager(trace_config).get_rtt_timeseries())
+
+        self.assertRaises(InvalidConfiguration,
+                          lambda : NetworkTraceManager(dataclasses.replace(trace_config, traceseed=None)))
+        self.assertRaises(InvalidConfiguration,
+                          lambda : NetworkTraceManager(dataclasses.replace(trace_config, observerPos=None)))
+        self.assertRaises(InvalidConfiguration, lambda : NetworkTraceManager(config['confBad']))
+
+    def test_bulk(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        configs = []
+        for seed in range(8):
+            config[f'confSeeded{seed}'] = config['confSeeded']
+            config[f'confSeeded{seed}']['traceseed'] = str(seed % 3)
+            config[f'confSeeded{seed}']['startingitemseed'] = str(seed)
+            config[f'confSeeded{seed}']['lazy'] = str(seed == 5)
+            configs.append(config[f'confSeeded{seed}'])
+
+        traces = NetworkTraceManager.bulk(configs)
+        self.assertEqual(len(configs), len(traces))
+        self.assertIsNone(traces[5]._rtt_trace)
+        for conf, trace in zip(configs, traces):
+            single_trace = NetworkTraceManager(conf)
+            self.assertEqual(single_trace._rtt_tracefile, trace._rtt_tracefile)
+            self.assertEqual(single_trace.get_rtt_timeseries(), trace.get_rtt_timeseries())
+            self.assertEqual([single_trace.get_rtt(0.3) for _ in range(10)],
+                             [trace.get_rtt(0.3) for _ in range(10)])
+
+        # traces read from the same file share the same base trace
+        self.assertIs(traces[0]._rtt_trace.base, traces[3]._rtt_trace.base)
+
+        self.assertRaises(InvalidConfiguration, lambda : NetworkTraceManager.bulk(configs + [config['confBad']]))
+        self.assertEqual([], NetworkTraceManager.bulk([]))
+
+    def test_iterators(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        stepped_trace = NetworkTraceManager(config['confSeeded'])
+        trace.get_rtt(0.7)
+        stepped_trace.get_rtt(0.7)
+
+        values = list(itertools.islice(trace.iter_rtt(0.013), 500))
+        chunks = trace.iter_rtt(0.013, chunk_size=100)
+        chunk = next(chunks)
+        self.assertIs(next(chunks), chunk)
+        self.assertEqual(values[400:], chunk.tolist())
+        # the iterators do not move the cursor
+        self.assertEqual(values, [stepped_trace.get_rtt(0.013)[0] for _ in range(500)])
+        self.assertEqual(trace.get_rtt(0.013 * 500), stepped_trace.get_rtt(0))
+
+        timestamps, values = trace.get_rtt_timeseries()
+        period = trace._rtt_trace.period / 1000000
+        samples = list(itertools.islice(trace.iter_samples(), 2 * len(values) + 1))
+        self.assertEqual([value for _, value in samples], values * 2 + values[:1])
+        self.assertAlmostEqual(samples[len(values)][0], period)
+        self.assertAlmostEqual(samples[-2][0], timestamps[-1] + period)
+
+        times, chunk_values = next(itertools.islice(trace.iter_samples(chunk_size=len(values) + 1), 1, None))
+        self.assertEqual(chunk_values.tolist(), values[1:] + values[:2])
+        self.assertAlmostEqual(times[-1], timestamps[1] + 2 * period)
+
+    def test_resample(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        trace = NetworkTraceManager(config['confSeeded'])
+        stepped_trace = NetworkTraceManager(config['confSeeded'])
+
+        resampled = trace.resample(0.01)
+        self.assertFalse(resampled.flags.writeable)
+        self.assertEqual(len(resampled), -(-trace._rtt_trace.period // 10000))
+        self.assertEqual(resampled.tolist(),
+                         [stepped_trace.get_rtt(0.01 if i > 0 else 0)[0] for i in range(len(resampled))])
+        self.assertIs(stepped_trace.resample(0.01), resampled)
+
+        # emptying the trace pool drops the resampled traces as well
+        _BaseTrace.clear()
+        self.assertIsNot(NetworkTraceManager(config['confSeeded']).resample(0.01), resampled)
+        self.assertEqual(NetworkTraceManager(config['confSeeded']).resample(0.01).tolist(), resampled.tolist())
+
+        timestamps, values = trace.get_rtt_timeseries(as_arrays=True)
+        linear = trace.resample(0.001, 'linear')
+        nearest = trace.resample(0.001, 'nearest')
+        self.assertEqual(len(linear), len(nearest))
+        for i in range(len(timestamps) - 1):
+            # the samples fall on the grid, as the trace has millisecond resolution: the
+            # last of the samples sharing the same timestamp is reproduced exactly
+            if timestamps[i] != timestamps[i + 1]:
+                index = int(round(timestamps[i] * 1000))
+                self.assertAlmostEqual(linear[index], values[i])
+                self.assertEqual(nearest[index], values[i])
+        self.assertTrue(((linear >= values.min()) & (linear <= values.max())).all())
+
+    def test_trace_player(self):
+        with tempfile.NamedTemporaryFile() as conf_file:
+            TestNetworkTraceManager.write_to_conf_file(conf_file)
+            config = configparser.ConfigParser()
+            config.read(conf_file.name)
+
+        traces = [NetworkTraceManager(config['confSeeded']) for _ in range(20)]
+        for i, trace in enumerate(traces):
+            trace.get_rtt(0.37 * i)
+        played = [[] for _ in traces]
+
+        async def play():
+            player = TracePlayer(speed=100)
+            streams = [player.play(trace, lambda value, timestamp, lateness, i=i: played[i].append((value, timestamp, lateness)),
+                                   duration=5)
+                       for i, trace in enumerate(traces)]
+            cancelled = player.play(traces[0], lambda *args: self.fail('cancelled stream played'))
+            cancelled.cancel()
+            await player.join(streams)
+            self.assertTrue(all(stream.done() for stream in streams))
+            self.assertEqual(len(player), 0)
+            self.assertIsNone(player._timer)
+
+        asyncio.run(play())
+
+        for i, trace in enumerate(traces):
+            self.assertGreater(len(played[i]), 0)
+            # the trace is not pushed forward
+            self.assertEqual(trace._rtt_timestamp, round(0.37 * i * 1000000))
+            timestamps = [timestamp for _, timestamp, _ in played[i]]
+            self.assertEqual(timestamps, sorted(set(timestamps)))
+            self.assertLess(timestamps[-1], 0.37 * i + 5)
+            for value, timestamp, lateness in played[i]:
+                self.assertGreaterEqual(lateness, 0)
+                index = trace._rtt_trace.locate(round(timestamp * 1000000))
+                self.assertEqual(value, trace._rtt_trace.base.values[index])
+
     def test_get_all_values(self):
         with tempfile.NamedTemporaryFile() as conf_file:
             TestNetworkTraceManager.write_to_conf_file(conf_file)
@@ -119,6 +792,91 @@ b'''[
             self.assertEqual({'Client', 'Server'}, trace.get_all_values('first-endpoint'))
             self.assertEqual({'Observer'}, trace.get_all_values('second-endpoint'))
 
+    def test_trace_metadata(self):
+        trace_file = 'inputFiles/active/wifi-TCPRTT-noise0M_Client_edge_trace0.txt'
+        timestamps, values = TraceCache.parse(trace_file)
+
+        with tempfile.TemporaryDirectory() as mapping_dir:
+            mapping_file = os.path.join(mapping_dir, 'mapping.json')
+            metadata_file = os.path.join(mapping_dir, TraceMetadata.FILENAME)
+            with open(mapping_file, 'w') as mapping_output:
+                json.dump([{"typeofmeasure": "active", "command": "TCPRTT", "direction": None,
+                            "noise": "0M", "path": [trace_file, trace_file]},
+                           {"typeofmeasure": "active", "command": "UDPRTT", "direction": None,
+                            "noise": "10M", "path": trace_file}], mapping_output)
+
+            trace_list = NetworkTraceManager.get_tracelist(mapping_file, noise='0M', sort_by='mean',
+                                                           trace_cache_dir=self.trace_cache_dir)
+            self.assertEqual(2, len(trace_list))
+            self.assertEqual(trace_file, trace_list[0]['path'])
+            self.assertEqual('TCPRTT', trace_list[0]['command'])
+            self.assertEqual(len(values), trace_list[0]['samples'])
+            self.assertAlmostEqual(values.mean(), trace_list[0]['mean'])
+            self.assertEqual(np.median(values), trace_list[0]['p50'])
+            self.assertEqual((timestamps[-1] - timestamps[0]) / 1000000, trace_list[0]['duration'])
+            self.assertTrue(os.path.exists(metadata_file))
+            with open(os.path.join(mapping_dir, 'new_file'), 'w'):
+                pass
+            self.assertEqual(os.stat(os.path.join(mapping_dir, 'new_file')).st_mode, os.stat(metadata_file).st_mode)
+
+            # misspelled statistics are rejected, rather than matching no trace
+            with self.assertRaises(ValueError):
+                NetworkTraceManager.get_tracelist(mapping_file, trace_filter={'median': (None, 20)})
+            with self.assertRaises(ValueError):
+                NetworkTraceManager.get_tracelist(mapping_file, sort_by='-median')
+
+            median = trace_list[0]['p50']
+            self.assertEqual(3, len(NetworkTraceManager.get_tracelist(
+                mapping_file, trace_filter={'p50': (median, median)}, trace_cache_dir=self.trace_cache_dir)))
+            self.assertEqual(0, len(NetworkTraceManager.get_tracelist(
+                mapping_file, trace_filter={'p50': (None, median - 1)}, trace_cache_dir=self.trace_cache_dir)))
+
+            # up-to-date statistics are read from the sidecar file, out-of-date ones are recomputed
+            with open(metadata_file) as metadata_input:
+                sidecar = json.load(metadata_input)
+            sidecar['traces'][trace_file]['mean'] = -1
+            TraceMetadata.write(metadata_file, sidecar['traces'])
+            self.assertEqual(-1, NetworkTraceManager.get_tracelist(
+                mapping_file, sort_by='-mean', trace_cache_dir=self.trace_cache_dir)[0]['mean'])
+
+            sidecar['traces'][trace_file]['mtime_ns'] += 1
+            TraceMetadata.write(metadata_file, sidecar['traces'])
+            self.assertAlmostEqual(values.mean(), NetworkTraceManager.get_tracelist(
+                mapping_file, sort_by='mean', trace_cache_dir=self.trace_cache_dir)[0]['mean'])
+
+        # traces found only in an archive, cached in the given directory; unreadable ones are skipped
+        with tempfile.TemporaryDirectory() as mapping_dir, tempfile.TemporaryDirectory() as cache_dir:
+            archive_file = os.path.join(mapping_dir, 'traces.tar.xz')
+            with tarfile.open(archive_file, 'w:xz') as archive:
+                archive.add(trace_file, arcname='active/trace0.txt')
+
+            archived_file = os.path.join(mapping_dir, 'active/trace0.txt')
+            missing_file = os.path.join(mapping_dir, 'active/missing.txt')
+            mapping_file = os.path.join(mapping_dir, 'mapping.json')
+            with open(mapping_file, 'w') as mapping_output:
+                json.dump([{"typeofmeasure": "active", "path": [missing_file, archived_file]}], mapping_output)
+
+            trace_list = NetworkTraceManager.get_tracelist(mapping_file, sort_by='mean', trace_cache_dir=cache_dir,
+                                                           trace_archive=archive_file)
+            self.assertEqual([archived_file], [record['path'] for record in trace_list])
+            self.assertEqual(len(values), trace_list[0]['samples'])
+            self.assertTrue(os.path.exists(TraceCache(cache_dir).cache_filename(archived_file)))
+
+    def test_facet_counts(self):
+        with tempfile.NamedTemporaryFile() as mapping_file:
+            TestNetworkTraceManager.write_to_mapping_file(mapping_file)
+
+            counts = NetworkTraceManager.facet_counts(mapping_file.name)
+            self.assertEqual({'active': 2}, counts['typeofmeasure'])
+            self.assertEqual({'TCPRTT': 1, 'TCPBandwidth': 1}, counts['command'])
+            self.assertEqual({'downstream': 1}, counts['direction'])
+            self.assertEqual({'Client': 1}, NetworkTraceManager.facet_counts(mapping_file.name, 'first-endpoint'))
+            self.assertEqual({}, NetworkTraceManager.facet_counts(mapping_file.name, 'path'))
+
+            catalog = MappingCatalog.load(mapping_file.name)
+            self.assertEqual(NetworkTraceManager.get_tracelist(mapping_file.name, command='TCPRTT'),
+                             list(catalog.facet('command')['TCPRTT']))
+
     def test_get_timeseries(self):
         with tempfile.NamedTemporaryFile() as conf_file:
             TestNetworkTraceManager.write_to_conf_file(conf_file)
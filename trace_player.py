@@ -0,0 +1,191 @@
+"""Play MECPerf traces in real time on an asyncio event loop"""
+
+import asyncio
+import bisect
+import heapq
+import itertools
+
+from network_trace_manager import NetworkTraceManager
+
+
+class TraceStream:
+    """A trace being played by a TracePlayer
+
+    The stream starts at the current position of the NetworkTraceManager it has been
+    created from (which is not pushed forward by the playback) and loops indefinitely,
+    unless a duration is given."""
+
+    __slots__ = ('_player', '_callback', '_timestamps', '_values', '_period', '_start',
+                 '_origin', '_end', '_loop_start', '_boundary', '_due', '_cancelled', '_done')
+
+    def __init__(self, player, manager, callback, trace_type, origin, duration):
+        timestamps, values, period, timestamp = manager.get_position(trace_type)
+
+        self._player = player
+        self._callback = callback
+        self._timestamps = timestamps.tolist()
+        self._values = values.tolist()
+        self._period = period
+        self._start = timestamp
+        self._origin = origin
+        self._end = None if duration is None else timestamp + round(duration * 1000000)
+        self._loop_start = timestamp - timestamp % self._period
+        self._boundary = timestamp
+        self._due = origin
+        self._cancelled = False
+        self._done = player._loop.create_future()
+
+    def cancel(self):
+        """Stop playing the trace"""
+
+        if not self._done.done():
+            self._cancelled = True
+            self._done.set_result(None)
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._done.done()
+
+    async def wait(self):
+        """Wait until the trace has been played for its whole duration, or cancelled"""
+
+        await asyncio.shield(self._done)
+
+    def _play(self, now):
+        """Report the sample in effect at the loop time now, and return the loop time of
+        the next sample boundary (None, if the playback is over)"""
+
+        # never before the boundary the stream has been scheduled for, whatever the
+        # rounding of the loop clock
+        timestamp = max(self._boundary,
+                        self._start + round((now - self._origin) * self._player.speed * 1000000))
+        if self._end is not None and timestamp >= self._end:
+            timestamp = self._end
+
+        # the samples that should have been reported while the loop was busy are skipped
+        # altogether: only the one in effect now is reported
+        relative_timestamp = timestamp - self._loop_start
+        if relative_timestamp >= self._period:
+            loops = relative_timestamp // self._period
+            self._loop_start += loops * self._period
+            relative_timestamp -= loops * self._period
+
+        index = bisect.bisect_right(self._timestamps, relative_timestamp) - 1
+        if index + 1 < len(self._timestamps):
+            boundary = self._loop_start + self._timestamps[index + 1]
+        else:
+            boundary = self._loop_start + self._period
+
+        try:
+            self._callback(self._values[index],
+                           (self._loop_start + self._timestamps[index]) / 1000000,
+                           now - self._due)
+        except Exception as e:
+            self._player._loop.call_exception_handler({
+                'message': 'Exception in trace player callback',
+                'exception': e,
+                'stream': self,
+            })
+
+        if self._end is not None and boundary >= self._end:
+            self._done.set_result(None)
+            return None
+
+        self._boundary = boundary
+        return self._player._loop_time(self, boundary)
+
+
+class TracePlayer:
+    """Play many traces concurrently in real time, on a single asyncio event loop
+
+    For each trace, a callback is called with the value of every sample as soon as it
+    takes effect: callback(value, trace time of the sample in seconds, lateness in
+    seconds). All the traces share a single timer (the earliest sample boundary of a
+    heap of them), and the sample boundaries are scheduled against the loop clock from
+    the beginning of the playback, so that lateness does not accumulate: a late
+    callback is followed by a correspondingly earlier one, and the samples superseded
+    while the loop was busy are skipped.
+
+    speed is the number of seconds of trace played in one second of loop time."""
+
+    def __init__(self, speed = 1.0):
+        assert speed > 0
+
+        self.speed = speed
+        self._loop = None
+        self._heap = []
+        self._counter = itertools.count()
+        self._timer = None
+        self._timer_due = None
+
+    def play(self, manager: NetworkTraceManager, callback, trace_type = 'rtt', duration = None) -> TraceStream:
+        """Start playing the RTT (or bandwidth) trace of manager, for duration seconds of
+        trace time (indefinitely, if None)
+
+        It must be called from a coroutine or a callback running on the event loop."""
+
+        assert trace_type in ['rtt', 'bandwidth']
+
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        assert self._loop is loop, "a TracePlayer is bound to a single event loop"
+
+        stream = TraceStream(self, manager, callback, trace_type, loop.time(), duration)
+        self._push(stream, stream._due)
+        return stream
+
+    async def join(self, streams = None):
+        """Wait until the given streams (all the streams being played, if None) are over"""
+
+        if streams is None:
+            streams = [stream for _, _, stream in self._heap]
+        await asyncio.gather(*(stream.wait() for stream in streams))
+
+    def __len__(self):
+        return sum(1 for _, _, stream in self._heap if not stream.done())
+
+    def _loop_time(self, stream, timestamp):
+        return stream._origin + (timestamp - stream._start) / 1000000 / self.speed
+
+    def _push(self, stream, due):
+        stream._due = due
+        heapq.heappush(self._heap, (due, next(self._counter), stream))
+        self._schedule()
+
+    def _schedule(self):
+        while self._heap and self._heap[0][2].done():
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = self._timer_due = None
+            return
+
+        due = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer_due <= due:
+                return
+            self._timer.cancel()
+
+        self._timer = self._loop.call_at(due, self._run)
+        self._timer_due = due
+
+    def _run(self):
+        self._timer = self._timer_due = None
+        now = self._loop.time()
+
+        while self._heap and self._heap[0][0] <= now:
+            _, _, stream = heapq.heappop(self._heap)
+            if stream.done():
+                continue
+
+            due = stream._play(now)
+            if due is not None:
+                heapq.heappush(self._heap, (due, next(self._counter), stream))
+                stream._due = due
+
+        self._schedule()
@@ -42,11 +42,10 @@ class UserTerminal:
             [f'{x}M' for x in range(0, 51, 10)])
         config['myconf2']['traceseed'] = str(identifier + 10000)
 
-        self.rtt_values = (
-            NetworkTraceManager(
-                config["myconf1"]).get_rtt_timeseries()[1],
-            NetworkTraceManager(
-                config["myconf2"]).get_rtt_timeseries()[1])
+        self.rtt_values = tuple(
+            manager.get_rtt_timeseries()[1]
+            for manager in NetworkTraceManager.bulk(
+                [config["myconf1"], config["myconf2"]]))
         assert len(self.rtt_values[0]) == len(self.rtt_values[1])
 
     def rtt(self, network: int) -> float:
@@ -244,15 +243,21 @@ def printRtt(num_seeds: int):
 
     access = ['wifi', 'lte']
     cross = [f'{x}M' for x in range(0, 51, 10)]
+    setups = []
     for seed in range(num_seeds):
         for a in access:
             for c in cross:
-                config['myconf']['access-technology'] = a
-                config['myconf']['cross-traffic'] = c
-                config['myconf']['traceseed'] = str(seed)
-                rtt = NetworkTraceManager(
-                    config["myconf"]).get_rtt_timeseries()[1]
-                print(f"#{seed} {a} {c} {rtt}")
+                section = f'myconf.{seed}.{a}.{c}'
+                config[section] = config['myconf']
+                config[section]['access-technology'] = a
+                config[section]['cross-traffic'] = c
+                config[section]['traceseed'] = str(seed)
+                setups.append((seed, a, c, config[section]))
+
+    managers = NetworkTraceManager.bulk([setup[3] for setup in setups])
+    for (seed, a, c, _), manager in zip(setups, managers):
+        rtt = manager.get_rtt_timeseries()[1]
+        print(f"#{seed} {a} {c} {rtt}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Preprocess all the traces referenced by a MECPerf mapping file
+
+Every trace file is parsed once, in a pool of worker processes, and stored in the binary
+trace cache, so that NetworkTraceManager instances never parse a text trace. The
+statistics of each trace (see TraceMetadata) are written next to the mapping file."""
+
+import argparse
+import lzma
+import os
+import sys
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from network_trace_manager import MappingCatalog, TraceArchive, TraceCache, TraceMetadata
+
+
+_trace_cache = None
+
+
+def trace_filenames(mapping_file):
+    """Return the distinct trace files referenced by mapping_file, in order"""
+
+    filenames = {}
+    for elem in MappingCatalog.load(mapping_file).entries:
+        for trace_filename in MappingCatalog._paths(elem):
+            filenames[trace_filename] = None
+    return list(filenames)
+
+
+def _init_worker(cache_dir, trace_archive):
+    global _trace_cache
+    _trace_cache = TraceCache(
+        cache_dir, True, TraceArchive.load(trace_archive) if trace_archive else None)
+
+
+def _warm_trace(trace_filename):
+    try:
+        mtime, size = _trace_cache.stat_source(trace_filename)
+        timestamps, values = _trace_cache.load(trace_filename)
+    except (OSError, ValueError, EOFError, lzma.LZMAError, tarfile.TarError) as e:
+        return trace_filename, None, str(e)
+
+    trace_metadata = TraceMetadata.describe(timestamps, values)
+    trace_metadata['mtime_ns'] = mtime
+    trace_metadata['size'] = size
+    return trace_filename, trace_metadata, None
+
+
+def warm(mapping_file, cache_dir=None, trace_archive=None, metadata_file=None,
+         workers=None, chunksize=64):
+    """Parse and cache all the traces referenced by mapping_file, and write their metadata
+
+    Return the metadata of the traces, the traces that could not be read along with the
+    reason, and the number of bytes of the trace files that have been processed."""
+
+    if metadata_file is None:
+        metadata_file = os.path.join(os.path.dirname(mapping_file), TraceMetadata.FILENAME)
+
+    metadata = {}
+    failures = {}
+    processed_bytes = 0
+
+    filenames = trace_filenames(mapping_file)
+    if trace_archive:
+        # every worker gets its chunks in order, so it only ever reads the archive forward
+        archive = TraceArchive.load(trace_archive)
+        filenames.sort(key=lambda trace_filename: archive.offset(trace_filename)
+                       if trace_filename in archive else -1)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache_dir, trace_archive)) as executor:
+        for trace_filename, trace_metadata, error in executor.map(
+                _warm_trace, filenames, chunksize=chunksize):
+            if trace_metadata is None:
+                failures[trace_filename] = error
+                continue
+
+            metadata[trace_filename] = trace_metadata
+            processed_bytes += trace_metadata['size']
+
+    TraceMetadata.write(metadata_file, metadata)
+    return metadata, failures, processed_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Preprocess the MECPerf traces into the binary trace cache',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument("--mapping_file", default='inputFiles/mapping.json',
+                        help="JSON mapping file")
+    parser.add_argument("--trace_cache_dir", default=None,
+                        help="Directory of the trace cache (by default, next to the trace files)")
+    parser.add_argument("--trace_archive", default=None,
+                        help="Archive containing the trace files")
+    parser.add_argument("--metadata_file", default=None,
+                        help="Metadata file (by default, " + TraceMetadata.FILENAME + " next to the mapping file)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (by default, the number of CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    metadata, failures, processed_bytes = warm(
+        args.mapping_file, args.trace_cache_dir, args.trace_archive,
+        args.metadata_file, args.workers)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    samples = sum(trace_metadata['samples'] for trace_metadata in metadata.values())
+    print(f'{len(metadata)} traces, {samples} samples, {processed_bytes / 1e6:.1f} MB '
+          f'in {elapsed:.2f} s: {len(metadata) / elapsed:.0f} traces/s, '
+          f'{samples / elapsed:.0f} samples/s, {processed_bytes / 1e6 / elapsed:.1f} MB/s')
+
+    for trace_filename, error in failures.items():
+        sys.stderr.write(f'Cannot read {trace_filename}: {error}\n')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())